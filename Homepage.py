@@ -1,11 +1,10 @@
 # Homepage
 
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import altair as alt
-import numpy as np
-import plotly.graph_objects as go
+
+import profiling
+from cache_manager import admin_enabled
+from theme import apply_theme
 
 st.set_page_config(
     page_title="US Trade Dashboard",
@@ -13,12 +12,20 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded")
 
-alt.themes.enable("dark")
+apply_theme()
 
 # Page Navigation
+# Page modules are only imported when first visited; their data is loaded
+# through the shared cached loader (data_loader.py) when the page renders.
 st.sidebar.title("Navigation")
-page = st.sidebar.radio("Go to", ["Trade Overview", "Product Focus", "Country Focus"])
+pages = ["Trade Overview", "Product Focus", "Country Focus"]
+# Cache sizes and counters for operators (DASHBOARD_ADMIN=1 only), see cache_manager.py
+if admin_enabled():
+    pages.append("Cache Admin")
+page = st.sidebar.radio("Go to", pages)
 
+# Opt-in timing panel (DASHBOARD_PROFILE=1 or ?profile=1), see profiling.py
+profiling.begin_rerun(page)
 if page == "Trade Overview":
     import demo
     demo.show_page()
@@ -28,3 +35,7 @@ elif page == "Product Focus":
 elif page == "Country Focus":
     import app3
     app3.show_page()
+elif page == "Cache Admin":
+    import cache_admin
+    cache_admin.show_page()
+profiling.end_rerun()
@@ -0,0 +1,121 @@
+from cache_manager import cached
+from data_loader import dataset_signature, load_dataset
+from profiling import stage
+
+### PRE-AGGREGATED TRADE CUBE ###
+# The export and import tables are rolled up once per dataset version into a cube
+# indexed by (year, Product Type, partner). The export/import measure columns are
+# the flow dimension, and the trade balance is precomputed next to them. A measure is
+# NaN when the partner has no rows for that flow, so callers can reproduce inner joins.
+# Pages only slice the cube and its roll-ups, they never group the raw tables.
+# The "over the years" charts read ready-made trend series (global, per product
+# type, per partner), split out of the roll-ups once per dataset version.
+
+CUBE_KEYS = ['year', 'Product Type', 'partner']
+MEASURES = ['value_export', 'value_import', 'value_trade balance']
+
+def build_trade_cube(df_exp, df_imp):
+    exp = df_exp.groupby(['year', 'Product Type', 'importer_name'], observed=True).agg(
+        value_export=('value', 'sum'), Continent=('Continent', 'first'))
+    exp.index.names = CUBE_KEYS
+    imp = df_imp.groupby(['year', 'Product Type', 'exporter_name'], observed=True).agg(
+        value_import=('value', 'sum'))
+    imp.index.names = CUBE_KEYS
+
+    cube = exp.join(imp, how='outer')
+    cube['value_trade balance'] = cube['value_export'] - cube['value_import']
+    return cube.sort_index()
+
+def rollup(cube, levels):
+    grouped = cube.groupby(level=levels, observed=True)
+    # min_count=1 keeps "no rows for this flow" as NaN instead of 0
+    totals = grouped[['value_export', 'value_import']].sum(min_count=1)
+    totals['value_trade balance'] = totals['value_export'] - totals['value_import']
+    if 'partner' in levels:
+        totals['Continent'] = grouped['Continent'].first()
+    return totals
+
+def data_version():
+    return (dataset_signature('exports'), dataset_signature('imports'))
+
+@cached('aggregates', max_entries=2)
+def _load_cube(signature):
+    df_exp, df_imp = load_dataset('exports'), load_dataset('imports')
+    with stage('build trade cube'):
+        return build_trade_cube(df_exp, df_imp)
+
+@cached('aggregates', max_entries=2)
+def _load_rollups(signature):
+    cube = _load_cube(signature)
+    with stage('build roll-ups'):
+        partner = rollup(cube, ['year', 'partner'])
+        return {
+            # Partners with both exports and imports, as in the merged Trade Overview table
+            'partner': partner.dropna(subset=['value_export', 'value_import']),
+            'product': rollup(cube, ['year', 'Product Type']),
+        }
+
+@cached('aggregates', max_entries=2)
+def _load_trends(signature):
+    rollups = _load_rollups(signature)
+    cube = _load_cube(signature)
+    with stage('build trend series'):
+        partner = rollup(cube, ['partner', 'year'])[MEASURES]
+        return {
+            # Summed over the partners with both flows, like the Trade Overview map
+            'global': rollups['partner'].groupby(level='year')[MEASURES].sum(),
+            'product': {str(product): rows.droplevel('Product Type')
+                        for product, rows in rollups['product'].groupby(level='Product Type', observed=True)},
+            'partner': {str(name): rows.droplevel('partner')
+                        for name, rows in partner.groupby(level='partner', observed=True)},
+        }
+
+def trade_cube():
+    return _load_cube(data_version())
+
+def years():
+    return trade_cube().index.unique(level='year')
+
+def product_types():
+    # Product types that appear in the export table, like the original sidebar list
+    product = _load_rollups(data_version())['product']
+    return sorted(product[product['value_export'].notna()].index.unique(level='Product Type'))
+
+def partners():
+    # Every partner with exports or imports in any year
+    return sorted(trade_cube().index.unique(level='partner'))
+
+def partner_totals(year=None):
+    # One row per (year, partner) with export, import, balance and continent
+    totals = _load_rollups(data_version())['partner']
+    if year is None:
+        return totals.reset_index()
+    return totals.loc[year].reset_index()
+
+def product_totals(year):
+    # One row per Product Type for the year, NaN where a flow has no rows
+    return _load_rollups(data_version())['product'].loc[year]
+
+def global_trend():
+    # Yearly export, import and balance totals
+    return _load_trends(data_version())['global']
+
+def product_trend(product):
+    # Yearly export/import totals for one Product Type
+    return _load_trends(data_version())['product'][product]
+
+def partner_trend(partner):
+    # Yearly export/import totals with one partner, NaN for a year without that flow
+    return _load_trends(data_version())['partner'][partner]
+
+def yearly_totals(keys):
+    # Export/import/balance by year and keys, NaN where a flow has no rows
+    return rollup(trade_cube(), ['year', *keys])[MEASURES]
+
+def product_partners(year, product):
+    # One row per partner trading the product in the year
+    cube = trade_cube()
+    if (year, product) not in cube.index:
+        return cube.iloc[:0].droplevel(['year', 'Product Type']).reset_index()
+    # The cube is sorted by (year, Product Type), so this is a slice rather than a scan
+    return cube.loc[(year, product)].reset_index()
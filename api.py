@@ -0,0 +1,181 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import queries
+import query_backend
+from deltas import DIMENSIONS, biggest_movers
+
+### HTTP QUERY SERVICE ###
+# Read-only JSON API over queries.py, for tools that want the dashboard's numbers
+# without rendering a page. It runs on Starlette/uvicorn (listed in
+# requirements.txt, as it can run without Streamlit's server) and shares the
+# data layer and caches with the app code.
+# - every response is {"version": <dataset version>, "data": ...}
+# - the ETag is a digest of the dataset version and the URL (path and sorted
+#   query): a client sending it back in If-None-Match gets a 304 for the same
+#   valid request, until a data file is replaced
+# - response bodies are kept in an LRU cache keyed by dataset version and URL,
+#   so a 304 only costs the request's validation and a cache lookup
+# - queries run in a worker thread, so one slow query does not block the others
+#
+# Usage: python api.py [--host 127.0.0.1] [--port 8600]
+#   GET /v1/years                                /v1/product-types
+#   GET /v1/countries                            /v1/trend[?product=...|?partner=...]
+#   GET /v1/top-partners?year=&type=[&n=]        /v1/trade-summary?year=
+#   GET /v1/top-products?year=&type=             /v1/product-partners?year=&product=&type=
+#   GET /v1/product-summary?year=&product=       /v1/country-trend?country=
+#   GET /v1/country-products?country=&year=&type=export|import[&n=]
+#   GET /v1/movers?dimension=&measure=export|import|balance&from=&to=[&key=...][&n=]
+# type is Export, Import or Trade Balance unless noted.
+
+RESPONSE_CACHE_SIZE = int(os.environ.get('DASHBOARD_API_CACHE_SIZE', 1024))
+
+#################### PARAMETERS
+def text_param(params, name, default=None):
+    value = params.get(name, default)
+    if value is None:
+        raise ValueError(f"missing query parameter {name!r}")
+    return value
+
+def int_param(params, name, default=None):
+    value = text_param(params, name, default)
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"query parameter {name!r} must be an integer, got {value!r}") from None
+
+def count_param(params, name='n', default=queries.TOP_N):
+    # Row counts: a 0 or negative n would become an empty or end-relative slice
+    value = int_param(params, name, default)
+    if value < 1:
+        raise ValueError(f"query parameter {name!r} must be at least 1, got {value}")
+    return value
+
+#################### ENDPOINTS
+def trend(params):
+    return queries.trend(params.get('product'), params.get('partner')).reset_index()
+
+def movers(params):
+    # biggest_movers() as {"risers": [...], "fallers": [...]}; key narrows the
+    # two-level dimensions (product_partner, country_product) to one product/country
+    dimension = text_param(params, 'dimension')
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"unknown dimension {dimension!r} (expected {', '.join(DIMENSIONS)})")
+    prefix = [text_param(params, 'key')] if len(DIMENSIONS[dimension]) > 1 else []
+    risers, fallers = biggest_movers(dimension, text_param(params, 'measure'), int_param(params, 'from'),
+                                     int_param(params, 'to'), *prefix, n=count_param(params))
+    return {'risers': json.loads(risers.reset_index().to_json(orient='records')),
+            'fallers': json.loads(fallers.reset_index().to_json(orient='records'))}
+
+# path -> function of the query parameters
+ENDPOINTS = {
+    '/v1/years': lambda p: [int(year) for year in query_backend.years()],
+    '/v1/product-types': lambda p: [str(product) for product in query_backend.product_types()],
+    '/v1/countries': lambda p: queries.countries(),
+    '/v1/top-partners': lambda p: queries.top_partners(int_param(p, 'year'), text_param(p, 'type'),
+                                                       count_param(p)).reset_index(),
+    '/v1/trade-summary': lambda p: queries.trade_summary(int_param(p, 'year')),
+    '/v1/top-products': lambda p: queries.top_products(int_param(p, 'year'), text_param(p, 'type')),
+    '/v1/product-partners': lambda p: queries.partners_by_type(int_param(p, 'year'), text_param(p, 'product'))[
+        queries.check_data_type(text_param(p, 'type'))],
+    '/v1/product-summary': lambda p: queries.product_summary(int_param(p, 'year'), text_param(p, 'product')),
+    '/v1/trend': trend,
+    '/v1/country-trend': lambda p: queries.country_trend(text_param(p, 'country')),
+    '/v1/movers': movers,
+    '/v1/country-products': lambda p: queries.country_products(int_param(p, 'year'), text_param(p, 'country'),
+                                                               text_param(p, 'type'), count_param(p)),
+}
+
+def to_json(result):
+    # DataFrames as a list of row objects (NaN -> null), anything else as is
+    if isinstance(result, pd.DataFrame):
+        return result.to_json(orient='records')
+    return json.dumps(result)
+
+#################### RESPONSE CACHE
+class ResponseCache:
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+response_cache = ResponseCache()
+
+def response_etag(key):
+    # (version, path, sorted query) -> quoted ETag of that one response
+    return '"' + hashlib.sha1(json.dumps(key).encode()).hexdigest()[:16] + '"'
+
+def respond(path, params):
+    # -> (status, body, ETag or None); runs in a worker thread
+    version = queries.dataset_version()
+    key = (version, path, tuple(sorted(params.items())))
+    body = response_cache.get(key)
+    if body is None:
+        try:
+            data = to_json(ENDPOINTS[path](params))
+        except ValueError as error:
+            return 400, json.dumps({'error': str(error)}).encode(), None
+        except KeyError as error:
+            return 404, json.dumps({'error': f"not found: {error}"}).encode(), None
+        body = f'{{"version": "{version}", "data": {data}}}'.encode()
+        response_cache.put(key, body)
+    return 200, body, response_etag(key)
+
+#################### APP
+def create_app():
+    from starlette.applications import Starlette
+    from starlette.concurrency import run_in_threadpool
+    from starlette.responses import JSONResponse, Response
+    from starlette.routing import Route
+
+    async def handle(request):
+        # only a valid request (status 200) can be answered with a 304
+        status, body, etag = await run_in_threadpool(respond, request.url.path, dict(request.query_params))
+        if status != 200:
+            return Response(body, status_code=status, media_type='application/json')
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if request.headers.get('if-none-match') == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(body, status_code=status, media_type='application/json', headers=headers)
+
+    async def index(request):
+        return JSONResponse({'endpoints': sorted(ENDPOINTS)})
+
+    return Starlette(routes=[Route('/', index)] + [Route(path, handle) for path in ENDPOINTS])
+
+if __name__ == '__main__':
+    import uvicorn
+    from streamlit.logger import set_log_level
+
+    parser = argparse.ArgumentParser(description="Serve the dashboard's queries as JSON over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1', help="interface to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8600, help="port to listen on (default: 8600)")
+    args = parser.parse_args()
+
+    # the data caches work outside a Streamlit app, without its runtime warnings
+    set_log_level('error')
+    uvicorn.run(create_app(), host=args.host, port=args.port)
@@ -3,31 +3,18 @@ import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
 
-# Load data
-trade_data1 = pd.read_csv('tab3data1.csv')
-
-def wrap_text(text, width=20):
-    words = text.split()
-    lines = []
-    current_line = ""
-
-    for word in words:
-        if len(current_line) + len(word) + 1 <= width:
-            if current_line:
-                current_line += " " + word
-            else:
-                current_line = word
-        else:
-            lines.append(current_line)
-            current_line = word
-
-    if current_line:
-        lines.append(current_line)
-
-    return '<br>'.join(lines)
+from data_loader import (dataset_signature, detail_chapters, detail_path, detail_signature, load_dataset, load_detail,
+                         load_partition, load_partitions, product_dataset, product_years)
+from downloads import download_section, frame_chunks, parquet_chunks
+from figure_cache import cached_figure, cached_figures
+from labels import wrap_labels
+from profiling import plotly_chart
+from deltas import biggest_movers, show_movers
+from queries import countries_products, countries_trend, largest_products
 
 def plot_import_export_stacked_and_lines_by_country(country):
-    trade_data_select = trade_data1[trade_data1['importer_name'] == country]
+    trade_data_select = load_partition('country_totals', 'importer_name', country)
+    years = sorted(int(year) for year in trade_data_select['year'].unique())
 
     # Stacked bar chart
     fig_stacked = go.Figure()
@@ -80,8 +67,9 @@ def plot_import_export_stacked_and_lines_by_country(country):
     ))
     fig_lines.update_layout(
         xaxis=dict(
-            tickvals=[2018, 2019, 2020, 2021, 2022],
-            ticktext=['2018', '2019', '2020', '2021', '2022']
+            # one tick per year in the data, including newly ingested ones
+            tickvals=years,
+            ticktext=[str(year) for year in years]
         ),
         yaxis=dict(title='',showgrid=False),
         legend=dict(
@@ -98,15 +86,15 @@ def plot_import_export_stacked_and_lines_by_country(country):
     return fig_stacked, fig_lines
 
 def create_treemap_q(data, type): 
-    data.sort_values(by=type+'_value', ascending=False, inplace=True)
-    data = data[data[type + '_value'] > 0]  # Filter out zero values
-    data.reset_index(drop=True, inplace=True)
-    data = data.head(10)
-    
-    data[type + '_value'] = (data[type + '_value'] / 1e9)
-    data[type + '_quantity'] = (data[type + '_quantity'] / 1e6).round(2)
-
-    data['Product Name'] = data['Product Name'].apply(lambda x: wrap_text(x, 20))
+    # Top 10 non-zero products, see queries.py
+    data = largest_products(data, type)
+
+    data = pd.DataFrame({
+        # wrapped_label is precomputed at load by data_loader; wrap here for other frames
+        'Product Name': data['wrapped_label'] if 'wrapped_label' in data else wrap_labels(data['Product Name']),
+        type + '_value': data[type + '_value'] / 1e9,
+        type + '_quantity': (data[type + '_quantity'] / 1e6).round(2),
+    }).reset_index(drop=True)
     
     color_scale = [
         [0, 'rgb(255, 215, 0)'],    # Gold (lower values)
@@ -140,64 +128,200 @@ def create_treemap_q(data, type):
     fig.update_traces(root_color="darkred")  
 
     return fig
-    
+
+#################### COUNTRY COMPARISON
+MAX_COMPARED = 4
+COMPARE_COLORS = ['#ffd700', '#ff4500', '#1e90ff', '#32cd32']
+
+def plot_compared_trends(trend, countries):
+    # One color per country: exports solid, imports dashed
+    fig = go.Figure()
+    by_country = dict(tuple(trend.groupby('country', observed=True)))
+    for country, color in zip(countries, COMPARE_COLORS):
+        rows = by_country.get(country)
+        if rows is None:
+            continue
+        fig.add_trace(go.Scatter(x=rows['year'], y=rows['export_value'], name=f'{country} exports', legendgroup=country,
+                                 mode='lines+markers', line=dict(color=color, width=2)))
+        fig.add_trace(go.Scatter(x=rows['year'], y=rows['import_value'], name=f'{country} imports', legendgroup=country,
+                                 mode='lines+markers', line=dict(color=color, width=2, dash='dash')))
+    fig.update_layout(
+        xaxis=dict(tickvals=sorted(trend['year'].unique().tolist()), title=''),
+        yaxis=dict(title='', showgrid=False),
+        legend=dict(orientation="h", x=0.5, y=-0.1, xanchor='center', yanchor='top'),
+        height=500,
+        margin=dict(t=0, l=0, r=0, b=0),
+    )
+    return fig
+
+#################### CACHED FIGURES
+# Shared across sessions through figure_cache, keyed by dataset version and selection
+def get_country_trade_figures(country):
+    return cached_figures(('app3.country_trade', dataset_signature('country_totals'), country),
+                          lambda: plot_import_export_stacked_and_lines_by_country(country))
+
+def get_treemap(year, country, type):
+    # only the requested year's partition is ever loaded
+    dataset = product_dataset(year)
+    def build():
+        return create_treemap_q(load_partition(dataset, 'country', country), type)
+    return cached_figure(('app3.treemap', dataset_signature(dataset), country, type), build)
+
+def get_detail_treemap(level, year, hs2, country, type):
+    # HS4/HS6 rows of one chapter, read from the detail store on demand
+    return cached_figure(('app3.detail_treemap', detail_signature(level, year, hs2), country, type),
+                         lambda: create_treemap_q(load_detail(level, year, hs2, country), type))
+
+def get_compared_trends(countries):
+    return cached_figure(('app3.compare_trend', dataset_signature('country_totals'), tuple(countries)),
+                         lambda: plot_compared_trends(countries_trend(countries), countries))
+
+def get_treemaps(year, countries, type):
+    # Same cache entries as get_treemap(); the missing ones are built from one pass over all countries
+    dataset = product_dataset(year)
+    tops = {}
+    def build(country):
+        if not tops:
+            tops.update(dict(tuple(countries_products(year, countries, type).groupby('country', observed=True))))
+        return create_treemap_q(tops.get(country, load_dataset(dataset).iloc[:0]), type)
+    return [cached_figure(('app3.treemap', dataset_signature(dataset), country, type), lambda country=country: build(country))
+            for country in countries]
+
+def product_names(country, years):
+    # hs2 -> Product Name of the country's products in the given years
+    names = {}
+    for year in years:
+        products = load_partition(product_dataset(year), 'country', country)
+        names.update(zip(products['hs2'].astype(str), products['Product Name'].astype(str)))
+    return names
+
+def chapter_options(country, years, type):
+    # HS2 chapter -> name for the drill-down, biggest chapter of the latest year first
+    chapters = sorted(set().union(*(detail_chapters('hs4', year) for year in years)))
+    products = load_partition(product_dataset(years[-1]), 'country', country) if years[-1] in product_years() else None
+    names = {}
+    if products is not None:
+        ranked = products[products['hs2'].isin(chapters)].sort_values(type + '_value', ascending=False)
+        names = dict(zip(ranked['hs2'].astype(str), ranked['Product Name'].astype(str)))
+    return {**names, **{hs2: f"HS2 {hs2}" for hs2 in chapters if hs2 not in names}}
+
+def show_comparison(countries, view_choice, year):
+    if not countries:
+        st.info("Pick at least one country to compare.")
+        return
+    st.markdown(f"<h1 style='text-align: center;'>US Trade with {', '.join(countries)}</h1>", unsafe_allow_html=True)
+
+    st.markdown("#### Exports (solid) and Imports (dashed)")
+    plotly_chart(get_compared_trends(countries), use_container_width=True)
+
+    type = "export" if view_choice == "Exports" else "import"
+    st.markdown(f"## Top 10 {type.capitalize()}ed Products in {year}")
+    for i, (column, country, fig) in enumerate(zip(st.columns(len(countries), gap='medium'), countries,
+                                                   get_treemaps(year, countries, type))):
+        with column:
+            st.markdown(f"### {country}")
+            plotly_chart(fig, use_container_width=True, key=f"compare_treemap_{i}")
+
+    st.markdown("<p style='font-size:20px; font-style:italic; text-align:center; margin-top:0;'>*Size represents Trade Value in Billion USD, Color represents Quantity in Millions Metric Tonnes</p>", unsafe_allow_html=True)
+
+    # generated only when the download button is clicked
+    download_section({
+        "Compared countries by year": lambda: frame_chunks(countries_trend(countries)),
+        f"Compared countries top {type}s {year}": lambda: frame_chunks(countries_products(year, countries, type)),
+    })
 
 def show_page():
     # Streamlit app layout
     st.sidebar.header("Select Options")
 
-    country_list = trade_data1['importer_name'].unique().tolist()
+    country_list = list(load_partitions('country_totals', 'importer_name'))
     selected_country = st.sidebar.selectbox("Select a Country", country_list, index=country_list.index("China"))
     view_choice = st.sidebar.radio("Select View:", ["Imports", "Exports"], horizontal=True)
+    years = product_years()
+    year_from = st.sidebar.selectbox("Compare Products In", years, index=0)
+    year_to = st.sidebar.selectbox("With", years, index=len(years) - 1)
 
-    st.markdown(f"<h1 style='text-align: center;'>US - {selected_country} Trade Dashboard</h1>", unsafe_allow_html=True)
+    # comparison mode: several countries side by side instead of the single-country view
+    if st.sidebar.toggle("Compare countries"):
+        compared = st.sidebar.multiselect(f"Countries to compare (up to {MAX_COMPARED})", country_list,
+                                          default=[selected_country], max_selections=MAX_COMPARED)
+        show_comparison(compared, view_choice, year_to)
+        return
 
-    fig_stacked, fig_lines = plot_import_export_stacked_and_lines_by_country(selected_country)
-    tree_map_data_2022 = pd.read_csv('tab3data2.csv')
-    tree_map_data_country_2022 = tree_map_data_2022[tree_map_data_2022['country'] == selected_country]
+    st.markdown(f"<h1 style='text-align: center;'>US - {selected_country} Trade Dashboard</h1>", unsafe_allow_html=True)
 
-    tree_map_data_2018 = pd.read_csv('tab3data3.csv')
-    tree_map_data_country_2018 = tree_map_data_2018[tree_map_data_2018['country'] == selected_country]
+    fig_stacked, fig_lines = get_country_trade_figures(selected_country)
+    trend_years = load_partition('country_totals', 'importer_name', selected_country)['year']
+    period = f"from {trend_years.min()} to {trend_years.max()}" if len(trend_years) else ""
 
     # Layout with 2 columns on top and 1 row at the bottom
     col = st.columns([0.5,0.5], gap='medium')
 
     with col[0]:
-        st.markdown(f"#### Export/Import from 2018 to 2022")
-        st.plotly_chart(fig_stacked, use_container_width=True)
+        st.markdown(f"#### Export/Import {period}")
+        plotly_chart(fig_stacked, use_container_width=True)
     with col[1]:
-        st.markdown(f"#### Trade Balance from 2018 to 2022")
-        st.plotly_chart(fig_lines, use_container_width=True)
+        st.markdown(f"#### Trade Balance {period}")
+        plotly_chart(fig_lines, use_container_width=True)
     
-    st.markdown(f"## Product Composition Comparison from 2018 to 2022")
+    st.markdown(f"## Product Composition Comparison from {year_from} to {year_to}")
     col = st.columns([0.5,0.5], gap='medium')
 
-    with col[0]:
-        if view_choice == "Exports":
-            st.markdown(f"### Top 10 Exported Products in 2018")
-            tree_map_fig2018 = create_treemap_q(tree_map_data_country_2018,"export")
-        else:
-            st.markdown(f"### Top 10 Imported Products in 2018")
-            tree_map_fig2018 = create_treemap_q(tree_map_data_country_2018,"import")
-        st.plotly_chart(tree_map_fig2018, use_container_width=True)
-
-    with col[1]:
-        # 2022
-        if view_choice == "Exports":
-            st.markdown(f"### Top 10 Exported Products in 2022")
-            tree_map_fig2022 = create_treemap_q(tree_map_data_country_2022,"export")
-        else:
-            st.markdown(f"### Top 10 Imported Products in 2022")
-            tree_map_fig2022 = create_treemap_q(tree_map_data_country_2022,"import")
-        st.plotly_chart(tree_map_fig2022, use_container_width=True)
+    for i, (column, year) in enumerate(zip(col, (year_from, year_to))):
+        with column:
+            if view_choice == "Exports":
+                st.markdown(f"### Top 10 Exported Products in {year}")
+                tree_map_fig = get_treemap(year, selected_country, "export")
+            else:
+                st.markdown(f"### Top 10 Imported Products in {year}")
+                tree_map_fig = get_treemap(year, selected_country, "import")
+            # keyed, since both sides render the same figure when the two years match
+            plotly_chart(tree_map_fig, use_container_width=True, key=f"treemap_{i}")
 
     st.markdown("<p style='font-size:20px; font-style:italic; text-align:center; margin-top:0;'>*Size represents Trade Value in Billion USD, Color represents Quantity in Millions Metric Tonnes</p>", unsafe_allow_html=True)
 
-
-
-
-
-
-
-
-        
\ No newline at end of file
+    # HS2 products that changed the most between the two years (precomputed, see deltas.py)
+    if year_from != year_to:
+        first, last = sorted((year_from, year_to))
+        st.markdown(f"## Biggest Movers from {first} to {last}")
+        try:
+            movers = biggest_movers('country_product', view_choice[:-1].lower(), first, last, selected_country)
+        except KeyError:
+            st.info(f"No product data for {selected_country} in {first} and {last}.")
+        else:
+            show_movers(*movers, "Product", names=product_names(selected_country, (first, last)))
+
+    # generated only when the download button is clicked
+    downloads = {f"{selected_country} totals by year":
+                 lambda: frame_chunks(load_partition('country_totals', 'importer_name', selected_country))}
+    for year in dict.fromkeys((year_from, year_to)):
+        downloads[f"{selected_country} products {year}"] = \
+            lambda year=year: frame_chunks(load_partition(product_dataset(year), 'country', selected_country))
+
+    # HS4/HS6 drill-down, for years ingested with `ingest.py --detail`
+    detail_years = [year for year in (year_from, year_to) if detail_chapters('hs4', year)]
+    if detail_years:
+        type = "export" if view_choice == "Exports" else "import"
+        chapters = chapter_options(selected_country, detail_years, type)
+        st.markdown("## Product Detail")
+        col = st.columns([0.7, 0.3])
+        chapter = col[0].selectbox("Drill into HS2 chapter", list(chapters), format_func=lambda hs2: f"{hs2} - {chapters[hs2]}")
+        level = col[1].radio("Detail level", ["HS4", "HS6"], horizontal=True).lower()
+
+        col = st.columns([0.5,0.5], gap='medium')
+        for i, (column, year) in enumerate(zip(col, (year_from, year_to))):
+            with column:
+                st.markdown(f"### Top 10 {level.upper()} Products in {year}")
+                if chapter in detail_chapters(level, year):
+                    plotly_chart(get_detail_treemap(level, year, chapter, selected_country, type),
+                                 use_container_width=True, key=f"detail_treemap_{i}")
+                else:
+                    st.info(f"No {level.upper()} detail for {year}.")
+
+        # whole years of detail can be large: scanned file by file, in batches
+        for year in dict.fromkeys(detail_years):
+            downloads[f"{selected_country} {level.upper()} detail {year}"] = lambda year=year: (
+                chunk for hs2 in detail_chapters(level, year)
+                for chunk in parquet_chunks(detail_path(level, year, hs2), [('country', selected_country)]))
+
+    download_section(downloads)
@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+### BENCHMARK SUITE ###
+# Runs the non-UI core of every page headlessly and reports latency, peak
+# Python memory (tracemalloc) and figure JSON size per selection. It runs once
+# on the shipped data and once per synthetic scale factor. Synthetic data adds
+# older years and splits every HS2 code into HS4/HS6-like sub-codes.
+# Each data set is benchmarked in a fresh subprocess pointed at it with
+# DASHBOARD_DATA_DIR, so nothing is shared through the loader caches.
+#
+# Usage: python benchmark.py [--scales 1 10 100] [--repeat 3] [--json results.json]
+
+DATA_TYPES = ["Export", "Import", "Trade Balance"]
+SAMPLE_COUNTRIES = ["China", "Germany", "Mexico"]
+SAMPLE_PRODUCTS = 2
+
+#################### SYNTHETIC DATA
+def synthesize(df, factor, code_column=None, add_years=True):
+    # factor ~ growth in rows: up to 4x through extra (older) years, the rest through finer product codes
+    rng = np.random.default_rng(factor)
+    years_mult = 1 if factor == 1 or not add_years else (2 if factor <= 10 else 4)
+    splits = max(1, factor // years_mult) if code_column else 1
+    value_columns = [c for c in df.columns if c.endswith('value') or c.endswith('quantity')]
+
+    span = int(df['year'].max() - df['year'].min() + 1)
+    out = pd.concat([df.assign(year=df['year'] - i * span) for i in range(years_mult)], ignore_index=True)
+    if splits > 1:
+        out = out.loc[out.index.repeat(splits)].reset_index(drop=True)
+        sub_codes = pd.Series(np.tile(np.arange(1, splits + 1), len(out) // splits)).astype(str).str.zfill(len(str(splits)) + 1)
+        out[code_column] = (out[code_column].astype(str) + sub_codes).astype('category')
+        if 'Product Name' in out:
+            out['Product Name'] = (out['Product Name'].astype(str) + ' ' + sub_codes).astype('category')
+    jitter = rng.uniform(0.5, 1.5, len(out)) / splits
+    for column in value_columns:
+        out[column] = out[column] * jitter
+    return out
+
+def write_synthetic(target_dir, factor):
+    from data_loader import DATA_DIR, DATASETS, columnar_path, load_dataset
+
+    for name in DATASETS:
+        try:
+            df = load_dataset(name)
+        except (FileNotFoundError, TypeError):
+            continue
+        if name in ('exports', 'imports'):
+            df = synthesize(df, factor, code_column='hs2')
+        elif name == 'country_totals':
+            df = synthesize(df, factor)
+        elif name.startswith('products_'):
+            df = synthesize(df.drop(columns=['wrapped_label']), factor, code_column='hs2', add_years=False)
+        path = os.path.join(target_dir, os.path.relpath(columnar_path(name), DATA_DIR))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_parquet(path, index=False)
+
+#################### SUITE (runs inside the benchmark subprocess)
+def figure_json_size(result):
+    figures = result if isinstance(result, tuple) else (result,)
+    if not all(isinstance(fig, go.Figure) for fig in figures):
+        return None
+    return sum(len(fig.to_json()) for fig in figures)
+
+def measure(case, selection, fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'case': case, 'selection': selection, 'median_ms': float(np.median(times)),
+            'min_ms': float(min(times)), 'peak_mib': peak / 2**20, 'figure_bytes': figure_json_size(result)}
+
+def run_suite(repeat):
+    from streamlit.logger import set_log_level
+    set_log_level('error')
+
+    import aggregates
+    import app3
+    import demo
+    import product_focus
+    import queries
+    from data_loader import load_dataset, load_partition, load_partitions, product_dataset, product_years
+    from labels import wrap_labels, wrap_text
+
+    results = []
+    def bench(case, selection, fn):
+        results.append(measure(case, selection, fn, repeat))
+
+    # Trade Overview and Product Focus need the export/import tables
+    try:
+        df_exp, df_imp = load_dataset('exports'), load_dataset('imports')
+    except FileNotFoundError:
+        df_exp = df_imp = None
+    if df_exp is not None:
+        bench('aggregates.build_trade_cube', 'all', lambda: aggregates.build_trade_cube(df_exp, df_imp))
+        cube = aggregates.trade_cube()
+        bench('aggregates.rollup', 'partner + product',
+              lambda: (aggregates.rollup(cube, ['year', 'partner']), aggregates.rollup(cube, ['year', 'Product Type'])))
+        years = list(aggregates.years())
+        for year in years:
+            bench('queries.top_products', f'{year} Trade Balance', lambda: queries.top_products(year, "Trade Balance"))
+            for selected_type in DATA_TYPES:
+                column = 'value_' + selected_type.lower()
+                bench('demo.make_choropleth', f'{year} {selected_type}',
+                      lambda: demo.make_choropleth(aggregates.partner_totals(year), 'partner', column,
+                                                   balance=selected_type == "Trade Balance"))
+        for product in aggregates.product_types()[:SAMPLE_PRODUCTS]:
+            bench('queries.partners_by_type', f'{years[-1]} {product}',
+                  lambda: queries.partners_by_type(years[-1], product))
+            for selected_type in DATA_TYPES:
+                bench('product_focus.make_choropleth', f'{years[-1]} {selected_type} {product}',
+                      lambda: product_focus.make_choropleth(queries.partners_by_type(years[-1], product)[selected_type], 'partner', 'value',
+                                                            balance=selected_type == "Trade Balance"))
+
+    # Country Focus
+    countries = [c for c in SAMPLE_COUNTRIES if c in load_partitions('country_totals', 'importer_name')]
+    for country in countries:
+        bench('app3.plot_import_export_stacked_and_lines_by_country', country,
+              lambda: app3.plot_import_export_stacked_and_lines_by_country(country))
+        for year in product_years():
+            for type in ("export", "import"):
+                bench('app3.create_treemap_q', f'{country} {year} {type}',
+                      lambda: app3.create_treemap_q(load_partition(product_dataset(year), 'country', country), type))
+
+    names = pd.concat([load_dataset(product_dataset(year))['Product Name'] for year in product_years()])
+    unique_names = names.astype(str).unique()
+    bench('labels.wrap_text', f'{len(unique_names)} names, uncached',
+          lambda: [wrap_text.__wrapped__(name) for name in unique_names])
+    bench('labels.wrap_labels', f'{len(names)} rows, memoized', lambda: wrap_labels(names))
+    return results
+
+#################### DRIVER
+def run_in_subprocess(data_dir, repeat):
+    env = dict(os.environ)
+    if data_dir:
+        env['DASHBOARD_DATA_DIR'] = data_dir
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--suite', '--repeat', str(repeat)],
+                          env=env, capture_output=True, text=True)
+    if proc.returncode:
+        raise SystemExit(f"benchmark suite failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def print_report(label, results):
+    print(f"\n=== {label} ===")
+    table = pd.DataFrame(results)
+    table['figure_kib'] = table.pop('figure_bytes') / 1024
+    with pd.option_context('display.max_rows', None, 'display.width', 200, 'display.float_format', '{:,.2f}'.format):
+        print(table.to_string(index=False))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the data and figure pipelines of every dashboard page.")
+    parser.add_argument('--scales', nargs='+', type=int, default=[1, 10, 100],
+                        help="data scale factors; 1 is the shipped data (default: 1 10 100)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per case (default: 3)")
+    parser.add_argument('--json', help="also write all results to this JSON file")
+    parser.add_argument('--suite', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.suite:
+        print(json.dumps(run_suite(args.repeat)))
+        raise SystemExit(0)
+
+    all_results = {}
+    for factor in args.scales:
+        if factor == 1:
+            results = run_in_subprocess(None, args.repeat)
+        else:
+            with tempfile.TemporaryDirectory(prefix=f'dashboard-bench-{factor}x-') as data_dir:
+                write_synthetic(data_dir, factor)
+                results = run_in_subprocess(data_dir, args.repeat)
+        label = 'shipped data' if factor == 1 else f'synthetic {factor}x'
+        print_report(label, results)
+        all_results[label] = results
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(all_results, f, indent=2)
@@ -0,0 +1,50 @@
+import numpy as np
+
+### BIN SCHEMES ###
+# Named value bins for the world maps, shared by every page. A scheme holds its
+# edges as a numpy array, so assigning a whole column is one np.searchsorted
+# call. Like pd.cut, bins are right-closed (edges[i], edges[i+1]]. Values
+# outside every bin (on the lowest edge, above the highest one, NaN) get code -1.
+# Callers pick the scheme explicitly (e.g. the balance scheme for Trade Balance)
+# instead of scanning the data for negative values.
+
+class BinScheme:
+    def __init__(self, edges, labels, colors):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.labels = list(labels)
+        self.colors = list(colors)
+
+    def assign(self, values):
+        # Bin index per value (int8), -1 where no bin applies
+        codes = np.searchsorted(self.edges, values, side='left') - 1
+        codes[codes >= len(self.labels)] = -1
+        return codes.astype(np.int8)
+
+    def __len__(self):
+        return len(self.labels)
+
+_YL_OR_RD = ['#ffffcc', '#ffeda0', '#fed976', '#feb24c', '#fd8d3c', '#fc4e2a', '#e31a1c', '#bd0026', '#800026']
+
+SCHEMES = {
+    # Trade Overview: yearly totals per partner
+    'overview': BinScheme(
+        [0, 500e6, 1e9, 3e9, 8e9, 18e9, 36e9, 71e9, 200e9, np.inf],
+        ['0-500M', '500M-1B', '1B-3B', '3B-8B', '8B-18B', '18B-36B', '36B-71B', '71B-200B', '> 200B'],
+        _YL_OR_RD),
+    'overview_balance': BinScheme(
+        [-np.inf, -200e9, -100e9, -30e9, -10e9, 0, 0.1e9, 0.2e9, 0.5e9, 1e9, 10e9, 30e9, np.inf],
+        ['<-200B', '-200B-100B', '-100B-30B', '-30B-10B', '-10B-0', '0-0.1B', '0.1B-0.2B', '0.2B-0.5B', '0.5B-1B', '1B-10B', '10B-30B', '>30B'],
+        ["#800026", "#bd0026", "#e31a1c", "#fc4e2a", "#feb24c", #negative
+         "#d0e1f2", "#a6bddb", "#74a9cf", "#2b8cbe", "#0570b0", "#045a8d", "#023858"]), #positive
+    # Product Focus: one product type per partner, so a wider range
+    'product': BinScheme(
+        [0, 1e5, 1e6, 10e6, 50e6, 100e6, 500e6, 1e9, 10e9, 50e9, 100e9, np.inf],
+        ['< 100K', '100K - 1M', '1M - 10M', '10M - 50M', '50M - 100M', '100M - 500M', '500M - 1B', '1B - 10B', '10B - 50B', '50B - 100B', '> 100B'],
+        _YL_OR_RD + ['#67001f', '#49000d']),
+    'product_balance': BinScheme(
+        [-np.inf, -150e9, -50e9, -30e9, -10e9, -5e9, -2.5e9, 0, 0.1e9, 0.2e9, 0.5e9, 1e9, 10e9, 30e9, np.inf],
+        ['<-150B', '-150B-50B', '-50B-30B', '-30B-10B', '-10B-5B', '-5B-2.5B', '-2.5B-0',
+         '0B-0.1B', '0.1B-0.2B', '0.2B-0.5B', '0.5B-1B', '1B-10B', '10B-30B', '>30B'],
+        ["#800026", "#bd0026", "#e31a1c", "#fc4e2a", "#fd8d3c", "#feb24c", "#fed976", #negative
+         "#eff3ff", "#bdd7e7", "#9ecae1", "#6baed6", "#4292c6", "#2171b5", "#084594"]), #positive
+}
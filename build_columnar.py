@@ -0,0 +1,48 @@
+import argparse
+import os
+
+from data_loader import (COLUMNAR_DIR, DATASETS, columnar_path, dataset_path, product_dataset,
+                         read_csv_typed, read_product_csv)
+
+### CSV -> PARQUET BUILD STEP ###
+# Converts the dashboard CSVs into typed Parquet files under columnar/.
+# data_loader picks these up automatically when they exist. Country/product
+# tables go into the year-partitioned store (columnar/country_products/<year>.parquet);
+# --products adds more years to it from CSVs with the tab3data2.csv columns.
+#
+# Usage: python build_columnar.py [dataset ...] [--products FILE.csv ...]
+
+def write_parquet(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_parquet(path, index=False)
+
+def build(names):
+    os.makedirs(COLUMNAR_DIR, exist_ok=True)
+    for name in names:
+        if not os.path.exists(dataset_path(name)):
+            print(f"skipping {name}: {dataset_path(name)} not found")
+            continue
+        df = read_csv_typed(name)
+        write_parquet(df, columnar_path(name))
+        print(f"{name}: {len(df)} rows -> {columnar_path(name)}")
+
+def add_product_years(paths):
+    # Any CSV may hold one or several years; each year becomes its own partition
+    for path in paths:
+        df = read_product_csv(path)
+        for year, part in df.groupby('year'):
+            write_parquet(part, columnar_path(product_dataset(year)))
+            print(f"{path}: {len(part)} rows -> {columnar_path(product_dataset(year))}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert the dashboard CSV files into typed Parquet files.")
+    parser.add_argument('datasets', nargs='*', help=f"datasets to convert (default: all of {', '.join(DATASETS)})")
+    parser.add_argument('--products', nargs='+', default=[], metavar='CSV',
+                        help="extra country/product CSVs to add to the year-partitioned store")
+    args = parser.parse_args()
+    unknown = set(args.datasets) - set(DATASETS)
+    if unknown:
+        parser.error(f"unknown dataset(s): {', '.join(sorted(unknown))}")
+    if args.datasets or not args.products:
+        build(args.datasets or list(DATASETS))
+    add_product_years(args.products)
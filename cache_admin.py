@@ -0,0 +1,57 @@
+import streamlit as st
+
+from cache_manager import admin_enabled, cache_breakdown, tier_stats, tiers
+from profiling import memory_footprint, process_rss_mib
+
+### CACHE ADMIN PAGE ###
+# Operator view of the process-wide caches (cache_manager.py): size against
+# budget, hit/miss/eviction/expiration counters per tier, the biggest caches,
+# and the frames the data layer still holds. Listed in the navigation only with
+# DASHBOARD_ADMIN=1, since its actions affect every session. Everything shown
+# is per process, shared by every session it serves.
+
+def show_page():
+    if not admin_enabled():
+        st.error("The Cache Admin page needs DASHBOARD_ADMIN=1.")
+        return
+    st.title("Cache Admin")
+
+    stats = tier_stats()
+    cols = st.columns(4, gap='medium')
+    cols[0].metric(label="Process RSS", value=f"{process_rss_mib():,.0f} MiB")
+    cols[1].metric(label="Cached", value=f"{stats['MiB'].sum():,.1f} MiB",
+                   delta=f"of {stats['budget MiB'].sum():,.0f} MiB budget", delta_color='off')
+    # evictions are LRU drops over budget, expirations are entries past their TTL
+    cols[2].metric(label="Evictions", value=f"{stats['evictions'].sum():,}")
+    cols[3].metric(label="Expirations", value=f"{stats['expirations'].sum():,}")
+
+    st.markdown("### Tiers")
+    stats.insert(3, 'used', stats['MiB'] / stats['budget MiB'])
+    st.dataframe(stats, hide_index=True, use_container_width=True, column_config={
+        'MiB': st.column_config.NumberColumn(format="%.1f"),
+        'used': st.column_config.ProgressColumn("used", format="percent", min_value=0, max_value=1),
+        'budget MiB': st.column_config.NumberColumn(format="%.0f"),
+        'hit rate': st.column_config.NumberColumn(format="percent"),
+    })
+
+    st.markdown("### Caches")
+    st.dataframe(cache_breakdown(), hide_index=True, use_container_width=True, column_config={
+        'MiB': st.column_config.NumberColumn(format="%.2f"),
+        'oldest_s': st.column_config.NumberColumn("oldest (s)", format="%.0f"),
+    })
+
+    st.markdown("### Frames held by the data layer")
+    # includes frames evicted from the cache but still referenced elsewhere
+    st.dataframe(memory_footprint(), hide_index=True, use_container_width=True,
+                 column_config={'MiB': st.column_config.NumberColumn(format="%.2f")})
+
+    st.markdown("### Actions")
+    cols = st.columns(len(tiers) + 1)
+    for col, (name, tier) in zip(cols, tiers.items()):
+        if col.button(f"Clear {name}", use_container_width=True):
+            tier.clear()
+            st.rerun()
+    if cols[-1].button("Reset counters", use_container_width=True):
+        for tier in tiers.values():
+            tier.reset_counters()
+        st.rerun()
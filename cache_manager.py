@@ -0,0 +1,229 @@
+import functools
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from profiling import frame_bytes
+
+### CACHE MANAGER ###
+# Every process-wide cache of frames and figures lives in one of three tiers,
+# each with its own memory budget, so a long-running worker's memory stays
+# bounded however many sessions and selections it serves:
+# - raw: frames read from the data files (datasets, partitions, HS detail)
+# - aggregates: everything derived from them (trade cube, roll-ups, trend
+#   series, deltas, query results, image groups)
+# - figures: rendered Plotly figures (sized by their JSON, see figure_cache.py)
+# A tier evicts its least recently used entries once it holds more than its
+# budget. With a TTL, entries older than that are dropped on access and swept
+# on every insertion (before any LRU eviction), so entries nobody asks for
+# again, e.g. keyed by an old file signature, do not wait for the budget.
+# A function can also cap its own number of entries (e.g. two dataset versions).
+# Sizes are estimated once per entry (deep frame sizes, string lengths). An
+# entry larger than the whole budget is kept until the next insertion.
+# Sessions keep nothing besides their widget values: every frame and figure a
+# page uses comes from these tiers and is shared read-only.
+# A few small caches sit outside the tiers. They are capped by entry count
+# only and are not shown on the Cache Admin page:
+# - api.response_cache: JSON API response bodies (DASHBOARD_API_CACHE_SIZE, 1024)
+# - labels.wrap_text: wrapped chart labels (lru_cache, 4096 strings)
+# - image_cache.thumbnail_src: thumbnail URL per image (st.cache_resource, 1024)
+# - query_backend._backend: one query backend (Arrow dataset or DuckDB
+#   connection) per backend name
+#
+# Budgets (MiB) and TTLs (seconds, unset = no expiry) per tier:
+#   DASHBOARD_CACHE_RAW_MB (1024), DASHBOARD_CACHE_AGGREGATES_MB (512), DASHBOARD_CACHE_FIGURES_MB (256)
+#   DASHBOARD_CACHE_RAW_TTL, DASHBOARD_CACHE_AGGREGATES_TTL, DASHBOARD_CACHE_FIGURES_TTL
+# Hit/miss/eviction/expiration counters and sizes of the tiers are shown on the Cache Admin page
+# (cache_admin.py). It can clear tiers every session relies on, so it is only
+# reachable when the worker is started with DASHBOARD_ADMIN=1.
+
+DEFAULT_BUDGETS_MB = {'raw': 1024, 'aggregates': 512, 'figures': 256}
+_MISSING = object()
+
+def admin_enabled():
+    # deployment setting only: no query parameter can turn it on for a visitor
+    return os.environ.get('DASHBOARD_ADMIN') == '1'
+
+def tier_setting(tier, setting, default=None):
+    value = os.environ.get(f'DASHBOARD_CACHE_{tier.upper()}_{setting}')
+    return float(value) if value else default
+
+#################### SIZES
+def value_bytes(value, seen=None):
+    # Approximate deep size of a cached value; sets of categories are counted
+    # once per entry (entries sharing them each count them)
+    seen = set() if seen is None else seen
+    if isinstance(value, pd.DataFrame):
+        return frame_bytes(value, seen)
+    if isinstance(value, pd.Series):
+        return frame_bytes(value.to_frame(), seen)
+    if isinstance(value, pd.Index):
+        return value.memory_usage(deep=True)
+    if isinstance(value, pd.CategoricalDtype):
+        return value.categories.memory_usage(deep=True)
+    if isinstance(value, np.ndarray) or hasattr(value, 'nbytes'):
+        # arrays, and entries that report their own size (figure_cache.Figures)
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(value_bytes(k, seen) + value_bytes(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(value_bytes(item, seen) for item in value)
+    return sys.getsizeof(value)
+
+#################### TIERS
+class CacheTier:
+    def __init__(self, name, max_bytes, ttl=None, max_entries=None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self.bytes = 0
+        # key -> (value, size in bytes, time stored); keys are tuples starting with the cache name
+        self._entries = OrderedDict()
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def _expired(self, stored):
+        return self.ttl is not None and time.monotonic() - stored > self.ttl
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def _lookup(self, key):
+        # -> value or _MISSING, with the lock held
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        if self._expired(entry[2]):
+            self._remove(key)
+            self.expirations += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _sweep(self):
+        # drop every expired entry, with the lock held
+        if self.ttl is None:
+            return
+        for key in [k for k, (_, _, stored) in self._entries.items() if self._expired(stored)]:
+            self._remove(key)
+            self.expirations += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def put(self, key, value, max_entries=None):
+        # max_entries caps the entries of this key's cache (key[0]) within the tier
+        size = value_bytes(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._sweep()
+            self._entries[key] = (value, size, time.monotonic())
+            self.bytes += size
+            if max_entries is not None:
+                same_cache = [k for k in self._entries if k[0] == key[0]]
+                for old in same_cache[:max(0, len(same_cache) - max_entries)]:
+                    self._evict(old)
+            for old in list(self._entries):
+                if old == key or not self._over_budget():
+                    break
+                self._evict(old)
+
+    def _over_budget(self):
+        return (self.bytes > self.max_bytes
+                or (self.max_entries is not None and len(self._entries) > self.max_entries))
+
+    def _evict(self, key):
+        self._remove(key)
+        self.evictions += 1
+
+    def get_or_build(self, key, build, max_entries=None):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        # One build per key at a time: sessions asking for the same entry wait for it
+        with self._lock:
+            building = self._building.setdefault(key, threading.Lock())
+        with building:
+            try:
+                with self._lock:
+                    value = self._lookup(key)
+                if value is _MISSING:
+                    value = build()
+                    self.put(key, value, max_entries)
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+        return value
+
+    def clear(self, cache=None):
+        # Drop every entry, or only those of one cache
+        with self._lock:
+            for key in [k for k in self._entries if cache is None or k[0] == cache]:
+                self._remove(key)
+
+    def reset_counters(self):
+        with self._lock:
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            self._sweep()
+            lookups = self.hits + self.misses
+            return {'tier': self.name, 'entries': len(self._entries), 'MiB': self.bytes / 2**20,
+                    'budget MiB': self.max_bytes / 2**20, 'TTL s': self.ttl,
+                    'hits': self.hits, 'misses': self.misses,
+                    'hit rate': self.hits / lookups if lookups else np.nan,
+                    'evictions': self.evictions, 'expirations': self.expirations}
+
+    def cache_sizes(self):
+        # -> [(cache name, size in bytes, age in seconds)] per entry, least recently used first
+        now = time.monotonic()
+        with self._lock:
+            return [(key[0], size, now - stored) for key, (_, size, stored) in self._entries.items()]
+
+tiers = {name: CacheTier(name, tier_setting(name, 'MB', budget) * 2**20, tier_setting(name, 'TTL'))
+         for name, budget in DEFAULT_BUDGETS_MB.items()}
+
+def cached(tier, max_entries=None):
+    # Memoize a function of hashable arguments in a tier, like st.cache_resource:
+    # every session gets the same (read-only) result object
+    def decorator(function):
+        name = f'{function.__module__}.{function.__name__}'
+
+        @functools.wraps(function)
+        def wrapper(*args):
+            return tiers[tier].get_or_build((name, *args), lambda: function(*args), max_entries)
+        return wrapper
+    return decorator
+
+#################### METRICS
+def tier_stats():
+    return pd.DataFrame([cache_tier.stats() for cache_tier in tiers.values()])
+
+def cache_breakdown():
+    # Entries and MiB per cache, largest first
+    rows = [(name, cache, size, age) for name, cache_tier in tiers.items()
+            for cache, size, age in cache_tier.cache_sizes()]
+    entries = pd.DataFrame(rows, columns=['tier', 'cache', 'bytes', 'age'])
+    breakdown = entries.groupby(['tier', 'cache'], sort=False).agg(
+        entries=('bytes', 'size'), MiB=('bytes', 'sum'), oldest_s=('age', 'max'))
+    breakdown['MiB'] /= 2**20
+    return breakdown.sort_values('MiB', ascending=False).reset_index()
@@ -0,0 +1,107 @@
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+### CHOROPLETH BUILDER ###
+# World maps for the Trade Overview and Product Focus tabs. The pages choose a
+# bin scheme (see binning.py) and this module draws the map.
+# The default compact mode sends a single go.Choropleth trace, so the payload is
+# small on every rerun:
+# - z is the bin code (int8), mapped to the bin colors by a stepped colorscale
+# - a horizontal colorbar lists the bins in place of the legend
+# - hover only carries the value and the category
+# - numeric arrays are numpy, which Plotly serializes as base64 typed arrays
+# - the figure has no template; the visible styling is set explicitly below
+# DASHBOARD_CHOROPLETH_MODE=px restores the original px.choropleth figure
+# (one trace per bin).
+
+MODE = os.environ.get('DASHBOARD_CHOROPLETH_MODE', 'compact')
+
+# Geo layout shared by every map
+GEO = dict(
+    visible=False,
+    showframe=False,
+    showcoastlines=False,
+    projection_type='equirectangular',
+    scope='world',
+    resolution=110,
+    showcountries=True,
+    countrycolor="Black",
+    coastlinecolor="Black",
+    showland=True,
+    landcolor='white',
+    showocean=False,
+    lakecolor='rgba(0, 0, 0, 0)',
+    bgcolor='rgba(0, 0, 0, 0)',
+    lataxis_range=[-60, 90],  # exclude Antarctica
+)
+
+HOVERTEMPLATE = '<b>%{location}</b><br>Value: %{customdata:,.0f} USD<br>Category: %{text}<extra></extra>'
+PX_HOVERTEMPLATE = '<b>%{hovertext}</b><br>Value: %{customdata[1]:,.0f} USD<br>Category: %{customdata[2]}<extra></extra>'
+
+def layout(width):
+    return dict(
+        plot_bgcolor='rgba(0, 0, 0, 0)',
+        paper_bgcolor='rgba(0, 0, 0, 0)',
+        margin=dict(l=0, r=0, t=0, b=0),
+        height=500,
+        width=width,
+        geo=GEO,
+    )
+
+def stepped_colorscale(colors):
+    # Code i fills [i/n, (i+1)/n], so with zmin=-0.5 and zmax=n-0.5 each code gets one solid color
+    n = len(colors)
+    return [[edge / n, color] for i, color in enumerate(colors) for edge in (i, i + 1)]
+
+def make_compact_choropleth(locations, values, codes, labels, colors, width):
+    # locations/values/codes are aligned arrays; code -1 means "outside every bin" and is not drawn
+    keep = codes >= 0
+    codes = codes[keep].astype(np.int8)
+    return go.Figure(
+        go.Choropleth(
+            locations=locations[keep],
+            locationmode="country names",
+            z=codes,
+            zmin=-0.5,
+            zmax=len(labels) - 0.5,
+            colorscale=stepped_colorscale(colors),
+            customdata=values[keep].astype(np.float64),
+            text=np.asarray(labels, dtype=object)[codes],
+            hovertemplate=HOVERTEMPLATE,
+            colorbar=dict(orientation='h', y=0, yanchor='bottom', x=0.5, xanchor='center',
+                          thickness=12, tickvals=np.arange(len(labels)), ticktext=labels, outlinewidth=0),
+        ),
+        layout=dict(template=None, **layout(width)),
+    )
+
+def make_px_choropleth(input_df, input_id, input_column, codes, labels, colors, width):
+    # Original figure: one trace per bin; category_orders keeps the legend in bin order
+    input_df = input_df.assign(**{'binned_' + input_column: pd.Categorical.from_codes(codes, categories=labels)})
+    choropleth = px.choropleth(
+        input_df,
+        locations=input_id,
+        color='binned_' + input_column,
+        locationmode="country names",
+        category_orders={'binned_' + input_column: labels},
+        color_discrete_sequence=colors,
+        hover_name=input_id,
+        hover_data={input_id: False, input_column: False, 'binned_' + input_column: False},
+    )
+    choropleth.update_traces(hovertemplate=PX_HOVERTEMPLATE)
+    choropleth.update_layout(
+        template='plotly_white',
+        legend=dict(orientation="h", yanchor="bottom", y=0, xanchor="center", x=0.5),
+        **layout(width),
+    )
+    return choropleth
+
+def build_choropleth(input_df, input_id, input_column, scheme, width):
+    values = input_df[input_column].to_numpy()
+    codes = scheme.assign(values)
+    if MODE == 'px':
+        return make_px_choropleth(input_df, input_id, input_column, codes, scheme.labels, scheme.colors, width)
+    return make_compact_choropleth(input_df[input_id].to_numpy(), values, codes, scheme.labels, scheme.colors, width)
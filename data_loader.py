@@ -0,0 +1,231 @@
+import os
+
+import pandas as pd
+
+from cache_manager import cached
+from labels import wrap_labels
+from profiling import stage, track_frame
+
+### SHARED DATA LAYER ###
+# Every page goes through load_dataset() instead of calling pd.read_csv itself.
+# Datasets are parsed once per process and the same frame is handed to every
+# session, so callers must treat the returned frames as read-only.
+
+# Folder holding the CSV files (defaults to the repo root, override for deployments)
+DATA_DIR = os.environ.get('DASHBOARD_DATA_DIR', os.path.dirname(os.path.abspath(__file__)))
+# Typed Parquet copies written by build_columnar.py
+COLUMNAR_DIR = os.path.join(DATA_DIR, 'columnar')
+# Country/product tables, one Parquet file per year (<year>.parquet)
+PRODUCT_STORE_DIR = os.path.join(COLUMNAR_DIR, 'country_products')
+# HS4/HS6 detail below the HS2 tables, one file per (level, year, HS2 chapter):
+# hs_detail/<level>/<year>/<hs2>.parquet, written by ingest.py --detail
+HS_DETAIL_DIR = os.path.join(COLUMNAR_DIR, 'hs_detail')
+DETAIL_LEVELS = ['hs4', 'hs6']
+# Upper bound on cached frames per loader (datasets plus product years)
+MAX_CACHED_FRAMES = 32
+
+DATASETS = {
+    'exports': 'exports_grouped.csv',
+    'imports': 'imports_grouped.csv',
+    'country_totals': 'tab3data1.csv',
+    'products_2022': 'tab3data2.csv',
+    'products_2018': 'tab3data3.csv',
+    'image_links': 'image_link.csv',
+}
+
+# Product datasets are named products_<year>. Years listed here also have a CSV
+# fallback; any other year only exists as a partition in PRODUCT_STORE_DIR.
+
+# Fixed dtypes so nothing is re-inferred on load. Repeated strings (countries,
+# products, HS codes) are categorical; hs2 stays text to keep its leading zero.
+# Years fit in int16. Quantities are float32 (only shown rounded, in millions of
+# tonnes); trade values stay float64 since they are summed and shown to the dollar.
+_FLOW_SCHEMA = {
+    'year': 'int16',
+    'hs2': 'category',
+    'value': 'float64',
+    'quantity': 'float32',
+    'hs_revision': 'category',
+    'Continent': 'category',
+    'Product Type': 'category',
+}
+_PRODUCT_SCHEMA = {
+    'year': 'int16',
+    'country': 'category',
+    'hs2': 'category',
+    'export_value': 'float64',
+    'export_quantity': 'float32',
+    'import_value': 'float64',
+    'import_quantity': 'float32',
+    'Product Name': 'category',
+}
+SCHEMAS = {
+    'exports': {**_FLOW_SCHEMA, 'importer_name': 'category'},
+    'imports': {**_FLOW_SCHEMA, 'exporter_name': 'category'},
+    'country_totals': {
+        'year': 'int16',
+        'importer_name': 'category',
+        'export_value': 'float64',
+        'exporter_name': 'category',
+        'import_value': 'float64',
+    },
+    'image_links': {'Group': 'category'},
+}
+# Categorical columns of the export and import tables that share one set of
+# categories (both partner columns are "partner"), so each string is stored once
+# for both tables and joins between them never have to recode categories.
+_SHARED_CATEGORIES = {
+    'exports': {'importer_name': 'partner', 'hs2': 'hs2', 'hs_revision': 'hs_revision',
+                'Continent': 'Continent', 'Product Type': 'Product Type'},
+    'imports': {'exporter_name': 'partner', 'hs2': 'hs2', 'hs_revision': 'hs_revision',
+                'Continent': 'Continent', 'Product Type': 'Product Type'},
+}
+
+def product_dataset(year):
+    return f'products_{year}'
+
+def product_years():
+    # Years with a product partition or a product CSV, oldest first
+    years = {int(name.split('_')[1]) for name in DATASETS
+             if name.startswith('products_') and os.path.exists(dataset_path(name))}
+    if os.path.isdir(PRODUCT_STORE_DIR):
+        years.update(int(f[:-len('.parquet')]) for f in os.listdir(PRODUCT_STORE_DIR) if f.endswith('.parquet'))
+    return sorted(years)
+
+def schema(name):
+    return _PRODUCT_SCHEMA if name.startswith('products_') else SCHEMAS[name]
+
+def dataset_path(name):
+    # CSV source, None for product years that only exist in the columnar store
+    filename = DATASETS.get(name)
+    return os.path.join(DATA_DIR, filename) if filename else None
+
+def columnar_path(name):
+    if name.startswith('products_'):
+        return os.path.join(PRODUCT_STORE_DIR, name[len('products_'):] + '.parquet')
+    return os.path.join(COLUMNAR_DIR, os.path.splitext(DATASETS[name])[0] + '.parquet')
+
+def source_path(name):
+    # Prefer the columnar copy, unless the CSV was edited after it was built
+    csv_path, parquet_path = dataset_path(name), columnar_path(name)
+    if not os.path.exists(parquet_path):
+        return csv_path
+    if csv_path and os.path.exists(csv_path) and os.stat(csv_path).st_mtime_ns > os.stat(parquet_path).st_mtime_ns:
+        return csv_path
+    return parquet_path
+
+def dataset_signature(name):
+    # mtime + size changes whenever the file is replaced, and is far cheaper than hashing it
+    path = source_path(name)
+    stat = os.stat(path)
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+def read_csv_typed(name):
+    return pd.read_csv(dataset_path(name), dtype=schema(name))
+
+def read_product_csv(path):
+    # Country/product CSV of any year(s), e.g. a new year for the product store
+    return pd.read_csv(path, dtype=_PRODUCT_SCHEMA)
+
+def apply_schema(name, df):
+    # Parquet files written before a schema change (e.g. int64 years) are cast on load
+    dtypes = {column: dtype for column, dtype in schema(name).items()
+              if column in df and str(df[column].dtype) != dtype}
+    return df.astype(dtypes) if dtypes else df
+
+def _read_columns(name, columns):
+    path = source_path(name)
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns, dtype='category')
+
+@cached('raw', max_entries=2)
+def _shared_dtypes(signatures):
+    # signatures of (exports, imports), only part of the cache key
+    with stage('shared categories'):
+        values = {}
+        for name, columns in _SHARED_CATEGORIES.items():
+            df = _read_columns(name, list(columns))
+            for column, group in columns.items():
+                values.setdefault(group, set()).update(df[column].dropna().astype(str).unique())
+        return {group: pd.CategoricalDtype(sorted(categories)) for group, categories in values.items()}
+
+def share_categories(name, df):
+    if name not in _SHARED_CATEGORIES:
+        return df
+    try:
+        dtypes = _shared_dtypes(tuple(dataset_signature(flow) for flow in _SHARED_CATEGORIES))
+    except FileNotFoundError:
+        # the other flow's file is missing: keep this table's own categories
+        return df
+    return df.astype({column: dtypes[group] for column, group in _SHARED_CATEGORIES[name].items() if column in df})
+
+def add_derived_columns(name, df):
+    # Display columns computed once per load instead of on every rerun
+    if name.startswith('products_'):
+        df['wrapped_label'] = wrap_labels(df['Product Name'])
+    return df
+
+@cached('raw', max_entries=MAX_CACHED_FRAMES)
+def _read_dataset(name, signature):
+    # signature is only part of the cache key: a new file/mtime/size forces a re-read
+    path = signature[0]
+    with stage(f'load {os.path.basename(path)}'):
+        if path.endswith('.parquet'):
+            # memory_map avoids an extra buffer copy while reading; the frame is still fully loaded
+            df = apply_schema(name, pd.read_parquet(path, memory_map=True))
+        else:
+            df = read_csv_typed(name)
+        df = add_derived_columns(name, share_categories(name, df))
+        track_frame(name, df)
+        return df
+
+def load_dataset(name):
+    return _read_dataset(name, dataset_signature(name))
+
+@cached('raw', max_entries=MAX_CACHED_FRAMES)
+def _partition_dataset(name, column, signature):
+    df = _read_dataset(name, signature)
+    with stage(f'partition {name} by {column}'):
+        # sort=False keeps the keys in first-appearance order, like Series.unique()
+        parts = {key: part for key, part in df.groupby(column, observed=True, sort=False)}
+        for key, part in parts.items():
+            track_frame(f'{name} by {column}', part, key)
+        return parts
+
+def load_partitions(name, column):
+    # dict of column value -> rows, built once per dataset version so lookups skip the O(N) mask
+    return _partition_dataset(name, column, dataset_signature(name))
+
+def load_partition(name, column, key):
+    partition = load_partitions(name, column).get(key)
+    if partition is None:
+        return load_dataset(name).iloc[:0]
+    return partition
+
+def detail_path(level, year, hs2):
+    return os.path.join(HS_DETAIL_DIR, level, str(year), f'{hs2}.parquet')
+
+def detail_chapters(level, year):
+    # HS2 chapters with detail for the year, empty when the level was never ingested
+    directory = os.path.join(HS_DETAIL_DIR, level, str(year))
+    if not os.path.isdir(directory):
+        return []
+    return sorted(f[:-len('.parquet')] for f in os.listdir(directory) if f.endswith('.parquet'))
+
+def detail_signature(level, year, hs2):
+    stat = os.stat(detail_path(level, year, hs2))
+    return (detail_path(level, year, hs2), stat.st_mtime_ns, stat.st_size)
+
+@cached('raw', max_entries=MAX_CACHED_FRAMES)
+def _read_detail(level, year, hs2, country, signature):
+    with stage(f'load {level} {year}/{hs2}'):
+        # files are sorted by country, so the filter skips the other countries' row groups
+        df = pd.read_parquet(signature[0], filters=[('country', '==', country)])
+        df['wrapped_label'] = wrap_labels(df['Product Name'])
+        track_frame(f'{level} {year}/{hs2}', df, country)
+        return df
+
+def load_detail(level, year, hs2, country):
+    # Rows of one (country, year, HS2 chapter) at HS4 or HS6, read on demand
+    return _read_detail(level, year, hs2, country, detail_signature(level, year, hs2))
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from cache_manager import cached
+from data_loader import dataset_signature, load_dataset, product_dataset, product_years
+from profiling import stage
+from query_backend import data_version, yearly_totals
+
+### DELTA ENGINE ###
+# Changes between years, precomputed once per dataset version for every pair of
+# years (consecutive years and longer periods alike), so the "biggest movers"
+# tables are lookups. For each key of a dimension and each (year_from, year_to):
+# - value_from / value_to, change and growth (change / |value_from|)
+# - rank_from / rank_to (1 = largest that year) and rank_change (positive = moved up)
+# - contribution: change / |total of value_from|, the key's share of the total's
+#   growth in percentage points (the contributions add up to the total's growth)
+# With two key columns, ranks and totals are taken within the first one (e.g. a
+# country's products are ranked against each other). A flow with no rows in a
+# year counts as 0.
+#
+# Dimensions (key columns):
+# - partner: partner                        - product: Product Type
+# - product_partner: Product Type, partner  (from the export/import tables)
+# - country_product: country, hs2           (from the country/product tables; computed per
+#                                           compared pair of years, loading only those two years)
+# Measures: export, import, balance (export - import).
+
+MEASURES = ['export', 'import', 'balance']
+DIMENSIONS = {
+    'partner': ('partner',),
+    'product': ('Product Type',),
+    'product_partner': ('Product Type', 'partner'),
+    'country_product': ('country', 'hs2'),
+}
+DELTA_COLUMNS = ['value_from', 'value_to', 'change', 'growth', 'rank_from', 'rank_to', 'rank_change', 'contribution']
+MOVERS_N = 10
+# Page data type -> measure
+DATA_TYPE_MEASURES = {"Export": 'export', "Import": 'import', "Trade Balance": 'balance'}
+
+#################### ENGINE
+def year_pairs(years):
+    return [(a, b) for i, a in enumerate(years) for b in years[i + 1:]]
+
+def delta_table(values):
+    # values: one row per key, one column per year. Every year pair in one batch:
+    # the (keys x years) matrices are indexed with the pairs' from/to column positions.
+    years = list(values.columns)
+    pairs = year_pairs(years)
+    matrix = values.to_numpy(dtype=np.float64)
+    if values.index.nlevels > 1:
+        groups = values.groupby(level=0, observed=True)
+        ranks = groups.rank(ascending=False, method='min').to_numpy()
+        totals = groups.transform('sum').to_numpy(dtype=np.float64)
+    else:
+        ranks = values.rank(axis=0, ascending=False, method='min').to_numpy()
+        totals = np.broadcast_to(matrix.sum(axis=0), matrix.shape)
+    if not pairs or not len(values):
+        index = pd.MultiIndex.from_arrays([[], []] + [[]] * values.index.nlevels,
+                                          names=['year_from', 'year_to', *values.index.names])
+        return pd.DataFrame(columns=DELTA_COLUMNS, index=index, dtype=np.float64)
+    position = {year: i for i, year in enumerate(years)}
+    i_from = np.array([position[a] for a, _ in pairs])
+    i_to = np.array([position[b] for _, b in pairs])
+
+    # (pairs, keys) arrays, flattened pair-major below
+    value_from, value_to = matrix[:, i_from].T, matrix[:, i_to].T
+    change = value_to - value_from
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.where(value_from != 0, change / np.abs(value_from), np.nan)
+        total_from = np.abs(totals[:, i_from].T)
+        contribution = np.where(total_from != 0, change / total_from, np.nan)
+    rank_from, rank_to = ranks[:, i_from].T, ranks[:, i_to].T
+
+    rows = len(values)
+    index = pd.MultiIndex.from_arrays(
+        [np.repeat([a for a, _ in pairs], rows), np.repeat([b for _, b in pairs], rows)]
+        + [np.tile(values.index.get_level_values(level), len(pairs)) for level in range(values.index.nlevels)],
+        names=['year_from', 'year_to', *values.index.names])
+    table = pd.DataFrame({
+        'value_from': value_from.ravel(), 'value_to': value_to.ravel(),
+        'change': change.ravel(), 'growth': growth.ravel(),
+        'rank_from': rank_from.ravel(), 'rank_to': rank_to.ravel(),
+        'rank_change': (rank_from - rank_to).ravel(),
+        'contribution': contribution.ravel(),
+    }, index=index)
+    return table.sort_index()
+
+def measure_tables(totals, keys, columns):
+    # {measure: delta table} from a long frame with year + keys and the export/import value columns
+    export_column, import_column = columns
+    totals = totals.assign(balance=totals[export_column].fillna(0) - totals[import_column].fillna(0))
+    tables = {}
+    for measure, column in zip(MEASURES, [export_column, import_column, 'balance']):
+        wide = totals.pivot_table(index=list(keys), columns='year', values=column, aggfunc='sum', fill_value=0, observed=True)
+        tables[measure] = delta_table(wide)
+    return tables
+
+#################### PRECOMPUTED DELTAS
+@cached('aggregates', max_entries=8)
+def _trade_deltas(dimension, version):
+    # version is only part of the cache key: new data files mean new deltas
+    keys = DIMENSIONS[dimension]
+    totals = yearly_totals(keys).reset_index()
+    with stage(f'deltas {dimension}'):
+        return measure_tables(totals, keys, ['value_export', 'value_import'])
+
+@cached('aggregates', max_entries=8)
+def _country_product_deltas(years, signatures):
+    # only the partitions of the compared years are loaded
+    products = pd.concat([load_dataset(product_dataset(year)) for year in years], ignore_index=True)
+    with stage('deltas country_product'):
+        products = products.astype({'country': str, 'hs2': str})
+        return measure_tables(products, DIMENSIONS['country_product'], ['export_value', 'import_value'])
+
+def delta_tables(dimension, years=None):
+    # years: the product years to compare, only used (and required) for country_product
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"unknown dimension {dimension!r} (expected {', '.join(DIMENSIONS)})")
+    if dimension == 'country_product':
+        years = tuple(sorted(set(years)))
+        if not set(years) <= set(product_years()):
+            raise KeyError(years)
+        return _country_product_deltas(years, tuple(dataset_signature(product_dataset(year)) for year in years))
+    return _trade_deltas(dimension, data_version())
+
+def period_deltas(dimension, measure, year_from, year_to, *prefix):
+    # Delta rows of one period, optionally only under a key prefix (e.g. one country)
+    if measure not in MEASURES:
+        raise ValueError(f"unknown measure {measure!r} (expected {', '.join(MEASURES)})")
+    table = delta_tables(dimension, (year_from, year_to))[measure]
+    key = (year_from, year_to, *prefix)
+    if key not in table.index:
+        raise KeyError(key)
+    return table.loc[key]
+
+def biggest_movers(dimension, measure, year_from, year_to, *prefix, n=MOVERS_N, by='change'):
+    # -> (risers, fallers): the n keys with the largest increase and decrease of `by`
+    deltas = period_deltas(dimension, measure, year_from, year_to, *prefix)
+    moved = deltas[deltas[by].notna() & (deltas[by] != 0)]
+    risers = moved[moved[by] > 0].nlargest(n, by)
+    fallers = moved[moved[by] < 0].nsmallest(n, by)
+    return risers, fallers
+
+#################### DISPLAY
+def movers_frame(moved, label, names=None):
+    frame = moved.reset_index()
+    key = frame.columns[0]
+    return pd.DataFrame({
+        label: frame[key].map(names).fillna(frame[key]) if names else frame[key],
+        'change': frame['change'] / 1e9,
+        'growth': frame['growth'] * 100,
+        'rank_change': frame['rank_change'],
+    })
+
+def show_movers(risers, fallers, label, names=None):
+    # Risers and fallers side by side, change in billion USD
+    column_config = {
+        'change': st.column_config.NumberColumn("Change (B USD)", format="%.2f"),
+        'growth': st.column_config.NumberColumn("Growth", format="%.1f%%"),
+        'rank_change': st.column_config.NumberColumn("Rank change", format="%+d"),
+    }
+    for column, (title, moved) in zip(st.columns(2, gap='medium'), (("Biggest risers", risers), ("Biggest fallers", fallers))):
+        with column:
+            st.markdown(f"#### {title}")
+            st.dataframe(movers_frame(moved, label, names), hide_index=True, use_container_width=True,
+                         column_config=column_config)
@@ -0,0 +1,116 @@
+import io
+import re
+
+import streamlit as st
+
+from data_loader import load_dataset, source_path
+
+### DATA DOWNLOADS ###
+# "Download data" box at the bottom of each page's sidebar: the numbers behind
+# the page's charts for the current selection, as CSV or Parquet.
+# Nothing is generated until the button is clicked: each option is a callable
+# returning an iterator of DataFrame chunks, and Streamlit runs the file writer
+# on click (deferred download). Chunks are slices of the cached frames or batches
+# scanned from the Parquet store, so a download never holds a second full copy
+# of the data next to the file. The file itself is assembled in memory, since
+# Streamlit needs its whole contents to serve it.
+# Every chunk source yields at least one (possibly empty) chunk, so an empty
+# selection still gives a CSV with its header row and a Parquet file with its schema.
+
+CHUNK_ROWS = 50_000
+# Display-only columns added at load time, left out of the files
+DISPLAY_COLUMNS = ['wrapped_label']
+FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+#################### CHUNK SOURCES
+def frame_chunks(df, rows=CHUNK_ROWS):
+    # Row slices of a (cached, read-only) frame
+    columns = [column for column in df.columns if column not in DISPLAY_COLUMNS]
+    for start in range(0, max(len(df), 1), rows):
+        yield df.iloc[start:start + rows][columns]
+
+def parquet_chunks(path, filters=None, rows=CHUNK_ROWS):
+    # Batches of a Parquet file, filtered by [(column, value)] equality pairs while scanning
+    import pyarrow.dataset as ds
+
+    condition = None
+    for column, value in filters or []:
+        term = ds.field(column) == value
+        condition = term if condition is None else condition & term
+    dataset = ds.dataset(path, format='parquet')
+    columns = [name for name in dataset.schema.names if name not in DISPLAY_COLUMNS]
+    matched = False
+    for batch in dataset.to_batches(columns=columns, filter=condition, batch_size=rows):
+        if batch.num_rows:
+            matched = True
+            yield batch.to_pandas()
+    if not matched:
+        yield dataset.schema.empty_table().select(columns).to_pandas()
+
+def dataset_chunks(name, filters=None, rows=CHUNK_ROWS):
+    # Rows of a dataset matching [(column, value)]: scanned from the Parquet store
+    # when there is one, otherwise masked chunk by chunk from the cached frame
+    path = source_path(name)
+    if path.endswith('.parquet'):
+        yield from parquet_chunks(path, filters, rows)
+        return
+    matched = False
+    for chunk in frame_chunks(load_dataset(name), rows):
+        # the mask only copies the matching rows of one chunk
+        for column, value in filters or []:
+            chunk = chunk[chunk[column] == value]
+        if len(chunk):
+            matched = True
+            yield chunk
+    if not matched:
+        yield chunk.iloc[:0]
+
+#################### WRITERS
+def write_csv(chunks, f):
+    header = True
+    for chunk in chunks:
+        f.write(chunk.to_csv(index=False, header=header).encode())
+        header = False
+
+def write_parquet(chunks, f):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            # categorical columns of later chunks may have more categories (wider codes) than the first one
+            schema = pa.schema([field.with_type(pa.dictionary(pa.int32(), field.type.value_type))
+                                if pa.types.is_dictionary(field.type) else field for field in table.schema],
+                               metadata=table.schema.metadata)
+            writer = pq.ParquetWriter(f, schema)
+        writer.write_table(table.cast(writer.schema))
+    if writer is None:
+        # no chunks at all: still a valid (column-less) Parquet file
+        pq.write_table(pa.table({}), f)
+    else:
+        writer.close()
+
+def file_bytes(chunks, file_format):
+    # -> contents of the whole file, written chunk by chunk to one in-memory buffer
+    with io.BytesIO() as f:
+        (write_parquet if file_format == 'Parquet' else write_csv)(chunks, f)
+        return f.getvalue()
+
+#################### WIDGET
+def file_stem(text):
+    return re.sub(r'[^0-9A-Za-z]+', '_', text).strip('_').lower()
+
+def download_section(options):
+    # options: label -> callable returning the chunks; shown in the sidebar
+    with st.sidebar.expander("Download data"):
+        label = st.selectbox("Data", list(options))
+        file_format = st.radio("Format", list(FORMATS), horizontal=True)
+        extension, mime = FORMATS[file_format]
+        make_chunks = options[label]
+        st.download_button(f"Download {extension.upper()}", data=lambda: file_bytes(make_chunks(), file_format),
+                           file_name=f"{file_stem(label)}.{extension}", mime=mime, on_click='ignore')
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import plotly.io as pio
+
+from cache_manager import tiers
+from data_loader import DATA_DIR
+from profiling import stage
+
+### FIGURE CACHE ###
+# Process-wide LRU cache of Plotly figures, shared by every session.
+# Keys are tuples of the page, the dataset version and the sidebar selection,
+# so users picking the same year/type/product/country reuse one rendered figure.
+# Misses fall back to the on-disk cache (figure JSON) filled by warmup.py before
+# building. Entries hold the Figure objects themselves, decoded once per miss:
+# decoding figure JSON costs about as much as building the figure, and
+# st.plotly_chart only reads the figure it is given, so a hit costs nothing.
+# The figures live in the 'figures' tier of cache_manager.py, which bounds them
+# by count (DASHBOARD_FIGURE_CACHE_SIZE) and by bytes of figure JSON.
+
+MAX_FIGURES = int(os.environ.get('DASHBOARD_FIGURE_CACHE_SIZE', 512))
+FIGURE_CACHE_DIR = os.environ.get('DASHBOARD_FIGURE_CACHE_DIR', os.path.join(DATA_DIR, 'figure_cache'))
+
+def key_digest(key):
+    # Stable across processes; numpy scalars from widgets format like plain ints
+    return hashlib.sha1(json.dumps(key, default=str).encode()).hexdigest()
+
+class Figures(tuple):
+    # The figures of one cache entry; nbytes (their JSON size) is what the tier counts
+    def __new__(cls, figures, payload):
+        entry = super().__new__(cls, figures)
+        entry.nbytes = sum(len(part) for part in payload)
+        return entry
+
+class FigureCache:
+    def __init__(self, tier, max_entries=MAX_FIGURES, disk_dir=FIGURE_CACHE_DIR):
+        self.tier = tier
+        self.tier.max_entries = max_entries
+        self.disk_dir = disk_dir
+        # The app only reads the disk tier; warmup.py turns writing on
+        self.persist = False
+
+    def get(self, key):
+        return self.tier.get(key)
+
+    def put(self, key, figures):
+        self.tier.put(key, figures)
+
+    def disk_path(self, key):
+        return os.path.join(self.disk_dir, key_digest(key) + '.json')
+
+    def read_disk(self, key):
+        try:
+            with open(self.disk_path(key), encoding='utf-8') as f:
+                # one figure JSON document per line (figure JSON never contains raw newlines)
+                return tuple(f.read().split('\n'))
+        except FileNotFoundError:
+            return None
+
+    def write_disk(self, key, payload):
+        os.makedirs(self.disk_dir, exist_ok=True)
+        path = self.disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(payload))
+        os.replace(tmp_path, path)
+
+    def load(self, key, build):
+        # On a memory miss: the disk tier, else build() (a tuple of figures)
+        with stage(f'read disk cache {key[0]}'):
+            payload = self.read_disk(key)
+        if payload is not None:
+            with stage(f'decode figure {key[0]}'):
+                return Figures((pio.from_json(part) for part in payload), payload)
+        with stage(f'build figure {key[0]}'):
+            figures = tuple(build())
+            payload = tuple(fig.to_json() for fig in figures)
+        if self.persist:
+            self.write_disk(key, payload)
+        return Figures(figures, payload)
+
+    def get_or_build(self, key, build):
+        return self.tier.get_or_build(key, lambda: self.load(key, build))
+
+    def clear(self):
+        self.tier.clear()
+
+    def __len__(self):
+        return len(self.tier)
+
+figure_cache = FigureCache(tiers['figures'])
+
+def cached_figures(key, build):
+    # The figures are shared: callers render them but never update them
+    return figure_cache.get_or_build(key, build)
+
+def cached_figure(key, build):
+    return cached_figures(key, lambda: (build(),))[0]
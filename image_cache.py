@@ -0,0 +1,123 @@
+import argparse
+import hashlib
+import io
+import os
+import urllib.parse
+import urllib.request
+
+import streamlit as st
+
+from cache_manager import cached
+from data_loader import dataset_signature, load_dataset
+from profiling import stage
+
+### EXAMPLE IMAGE CACHE ###
+# The Product Focus tab shows a few example images per product type
+# (image_link.csv). Instead of sending the remote Wikimedia originals to every
+# client, each image is fetched once, shrunk to a thumbnail, and saved under
+# static/thumbnails/. Streamlit's static file serving (enableStaticServing in
+# .streamlit/config.toml) then serves it from /app/static/thumbnails/.
+# Originals come from DASHBOARD_IMAGE_DIR when set (files named like the last
+# part of the URL, unquoted, e.g. Standing-rib-roast.jpg), otherwise from the
+# network. SVGs, videos and images that cannot be fetched keep their remote URL.
+#
+# Usage: python image_cache.py [--source DIR] [--force]   (builds every thumbnail ahead of time)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+THUMBNAIL_DIR = os.path.join(STATIC_DIR, 'thumbnails')
+THUMBNAIL_URL = '/app/static/thumbnails/'
+IMAGE_SOURCE_DIR = os.environ.get('DASHBOARD_IMAGE_DIR')
+# Longest side in pixels; the images are shown two per row in a narrow column
+THUMBNAIL_SIZE = 320
+DOWNLOAD_TIMEOUT = 10
+# Wikimedia rejects requests without a descriptive User-Agent
+USER_AGENT = 'us-trade-dashboard/1.0 (example image thumbnails)'
+IMAGES_PER_GROUP = 4
+# Formats Pillow can shrink; anything else is shown from its remote URL
+RASTER_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+
+def thumbnail_name(url):
+    return hashlib.sha1(url.encode()).hexdigest()[:16] + '.jpg'
+
+def source_filename(url):
+    return urllib.parse.unquote(os.path.basename(urllib.parse.urlparse(url).path))
+
+def is_raster(url):
+    return os.path.splitext(source_filename(url))[1].lower() in RASTER_EXTENSIONS
+
+def fetch_original(url, source_dir=IMAGE_SOURCE_DIR):
+    if source_dir:
+        with open(os.path.join(source_dir, source_filename(url)), 'rb') as f:
+            return f.read()
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response:
+        return response.read()
+
+def write_thumbnail(data, path):
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # written next to the target and renamed, so a half-written file is never served
+    partial = f'{path}.{os.getpid()}.tmp'
+    image.convert('RGB').save(partial, 'JPEG', quality=85, optimize=True)
+    os.replace(partial, path)
+
+def build_thumbnail(url, source_dir=IMAGE_SOURCE_DIR, force=False):
+    # -> path of the thumbnail, created if missing (or if force)
+    path = os.path.join(THUMBNAIL_DIR, thumbnail_name(url))
+    if force or not os.path.exists(path):
+        write_thumbnail(fetch_original(url, source_dir), path)
+    return path
+
+@st.cache_resource(max_entries=1024, show_spinner=False)
+def thumbnail_src(url):
+    # Static URL of the thumbnail; the remote original if it cannot be built.
+    # Cached per process, so a failed download is not retried on every rerun.
+    if not is_raster(url):
+        return url
+    with stage('thumbnail'):
+        try:
+            return THUMBNAIL_URL + os.path.basename(build_thumbnail(url))
+        except Exception:
+            return url
+
+@cached('aggregates', max_entries=2)
+def _image_groups(signature):
+    # signature is only part of the cache key: an edited image_link.csv is re-grouped
+    links = load_dataset('image_links')
+    return {str(group): list(zip(rows['Sampled Products'], rows['url']))
+            for group, rows in links.groupby('Group', observed=True, sort=False)}
+
+def build_thumbnails(urls, source_dir=IMAGE_SOURCE_DIR, force=False):
+    # -> (built, skipped, failures): thumbnails already on disk are skipped unless force
+    built, skipped, failures = 0, 0, []
+    for url in urls:
+        if not force and os.path.exists(os.path.join(THUMBNAIL_DIR, thumbnail_name(url))):
+            skipped += 1
+            continue
+        try:
+            build_thumbnail(url, source_dir, force)
+            built += 1
+        except Exception as error:
+            failures.append((url, error))
+    return built, skipped, failures
+
+def product_images(group, limit=IMAGES_PER_GROUP):
+    # [(caption, image src)] of the first `limit` example images of a product type
+    images = _image_groups(dataset_signature('image_links')).get(group, [])[:limit]
+    return [(caption, thumbnail_src(url)) for caption, url in images]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the example image thumbnails served by the Product Focus tab.")
+    parser.add_argument('--source', default=IMAGE_SOURCE_DIR,
+                        help="directory with the original images (default: download them)")
+    parser.add_argument('--force', action='store_true', help="rebuild thumbnails that already exist")
+    args = parser.parse_args()
+
+    urls = [url for url in load_dataset('image_links')['url'].drop_duplicates() if is_raster(url)]
+    built, skipped, failures = build_thumbnails(urls, args.source, args.force)
+    for url, error in failures:
+        print(f"{url}: {error}")
+    print(f"{built + skipped} of {len(urls)} thumbnails in {THUMBNAIL_DIR} ({built} built, {skipped} already there)")
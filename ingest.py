@@ -0,0 +1,231 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from build_columnar import write_parquet
+from data_loader import (DETAIL_LEVELS, columnar_path, detail_path, product_dataset, product_years, read_csv_typed,
+                         schema, source_path)
+
+### INCREMENTAL INGESTION FROM OEC BULK FILES ###
+# Streams raw OEC bulk trade files in chunks and keeps only the flows of the
+# reporter (the US by default). They are aggregated to (year, partner, HS2) and
+# merged into the dashboard's store:
+# - rows for new keys are appended
+# - rows whose value or quantity changed replace the stored row
+# - unchanged rows are left as they are
+# Only the years touched by new or revised rows get their country totals and
+# product partition rebuilt. A touched year's product partition
+# (columnar/country_products/<year>.parquet) is rebuilt from the merged
+# export/import tables and replaces the whole file, so edits made to that file
+# by hand are lost. Files are only rewritten when something changed, so the
+# app's caches (keyed on file mtime/size) survive a no-op run.
+#
+# With --detail, the same pass also sums to HS4 and HS6 and writes the drill-down
+# store (columnar/hs_detail/<level>/<year>/<hs2>.parquet) for every ingested year.
+#
+# Raw files need year, exporter_name, importer_name, value and quantity columns
+# plus one product code column (hs6, hs4 or hs2); hs_revision is kept if present.
+# Detail product names come from --names, a CSV with code,description columns
+# (e.g. the product code list shipped with the bulk download).
+#
+# Usage: python ingest.py RAW.csv [RAW.csv ...] [--reporter "United States"] [--chunksize 500000]
+#                         [--detail [--names CODES.csv]] [--dry-run]
+
+REPORTER = "United States"
+CHUNKSIZE = 500_000
+PRODUCT_CODE_COLUMNS = ['hs6', 'hs4', 'hs2']
+MEASURES = ['value', 'quantity']
+# Detail files are sorted by country; small row groups let a country filter skip most of a file
+DETAIL_ROW_GROUP_SIZE = 2_000
+
+#################### STREAMING AGGREGATION
+def product_code_column(path):
+    columns = pd.read_csv(path, nrows=0).columns
+    for column in PRODUCT_CODE_COLUMNS:
+        if column in columns:
+            return column, 'hs_revision' in columns
+    raise ValueError(f"{path}: no product code column (expected one of {', '.join(PRODUCT_CODE_COLUMNS)})")
+
+def code_width(level):
+    return int(level[2:])
+
+def aggregate_chunk(chunk, codes, partner_column, level):
+    return (chunk.assign(partner=chunk[partner_column], **{level: codes.str[:code_width(level)]})
+            .groupby(['year', 'partner', level], observed=True)
+            .agg(value=('value', 'sum'), quantity=('quantity', 'sum'), hs_revision=('hs_revision', 'first')))
+
+def stream_flows(paths, reporter=REPORTER, chunksize=CHUNKSIZE, levels=('hs2',)):
+    # {level: (exports, imports)} of the reporter, summed to (year, partner, code); memory is bounded by the chunk size
+    parts = {level: ([], []) for level in levels}
+    for path in paths:
+        code_column, has_revision = product_code_column(path)
+        if code_width(code_column) < max(map(code_width, levels)):
+            raise ValueError(f"{path}: {code_column} codes are too coarse for {', '.join(levels)}")
+        usecols = ['year', 'exporter_name', 'importer_name', code_column, 'value', 'quantity'] + (['hs_revision'] if has_revision else [])
+        for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunksize, dtype={code_column: str},
+                                 skipinitialspace=True, na_values=['NA']):
+            if not has_revision:
+                chunk['hs_revision'] = np.nan
+            for flow, (reporter_column, partner_column) in enumerate((('exporter_name', 'importer_name'),
+                                                                      ('importer_name', 'exporter_name'))):
+                rows = chunk[chunk[reporter_column] == reporter]
+                codes = rows[code_column].str.zfill(code_width(code_column))
+                for level in levels:
+                    parts[level][flow].append(aggregate_chunk(rows, codes, partner_column, level))
+    def combine(chunks):
+        # partial sums of the chunks are summed once more
+        return (pd.concat(chunks).groupby(level=[0, 1, 2])
+                .agg(value=('value', 'sum'), quantity=('quantity', 'sum'), hs_revision=('hs_revision', 'first'))
+                .reset_index())
+    return {level: (combine(exports), combine(imports)) for level, (exports, imports) in parts.items()}
+
+#################### STORE
+def read_store(name):
+    path = source_path(name)
+    if path is None or not os.path.exists(path):
+        return None
+    return pd.read_parquet(path) if path.endswith('.parquet') else read_csv_typed(name)
+
+def typed(name, df):
+    return df.astype({column: dtype for column, dtype in schema(name).items() if column in df})
+
+def match_code_format(codes, stored):
+    # Some stores keep HS2 without the leading zero ("1" instead of "01")
+    if stored is not None and (stored.astype(str).str.len() == 1).any():
+        return codes.str.lstrip('0')
+    return codes
+
+def label_flows(flows, partner_column, stored):
+    # Continent and Product Type come from the rows already in the store
+    flows = flows.rename(columns={'partner': partner_column})
+    if stored is None:
+        return flows.assign(Continent=np.nan, **{'Product Type': np.nan})
+    flows['hs2'] = match_code_format(flows['hs2'], stored['hs2'])
+    continents = stored.drop_duplicates(partner_column).set_index(partner_column)['Continent']
+    product_types = stored.drop_duplicates('hs2').set_index('hs2')['Product Type']
+    flows['Continent'] = flows[partner_column].map(continents)
+    flows['Product Type'] = flows['hs2'].map(product_types)
+    return flows[list(stored.columns)]
+
+def merge_rows(stored, update, keys):
+    # -> (merged table, changed rows); appends new keys and replaces keys whose measures changed
+    if stored is None:
+        return update, update
+    # compare per key sums, the store may split a key over several rows
+    old = stored.groupby(keys, observed=True)[MEASURES].sum(min_count=1)
+    new = update.set_index(keys)
+    common = new.index.intersection(old.index)
+    same = np.ones(len(common), dtype=bool)
+    for column in MEASURES:
+        same &= np.isclose(new.loc[common, column].to_numpy(), old.loc[common, column].to_numpy(), equal_nan=True)
+    changed = new.loc[new.index.difference(old.index).append(common[~same])].reset_index()
+    if changed.empty:
+        return stored, changed
+    replaced = stored.set_index(keys).index.isin(changed.set_index(keys).index)
+    merged = pd.concat([stored[~replaced], changed[list(stored.columns)]]).sort_values(keys, kind='stable')
+    return merged.reset_index(drop=True), changed
+
+#################### DERIVED TABLES
+def country_totals(exports, imports, years):
+    exp = exports[exports['year'].isin(years)].groupby(['year', 'importer_name'], observed=True)['value'].sum()
+    imp = imports[imports['year'].isin(years)].groupby(['year', 'exporter_name'], observed=True)['value'].sum()
+    exp.index.names = imp.index.names = ['year', 'country']
+    totals = pd.concat({'export_value': exp, 'import_value': imp}, axis=1).fillna(0).reset_index()
+    return totals.assign(importer_name=totals['country'], exporter_name=totals['country'])[
+        ['year', 'importer_name', 'export_value', 'exporter_name', 'import_value']]
+
+def product_table(exports, imports, year, product_names, level='hs2'):
+    # Country/product table (tab3data2.csv layout) of one year at the given code level
+    def flow(df, partner_column, prefix):
+        rows = df[df['year'] == year].rename(columns={partner_column: 'country'})
+        return (rows.groupby(['country', level], observed=True)[MEASURES].sum()
+                .rename(columns=lambda column: f'{prefix}_{column}'))
+    table = flow(exports, 'importer_name', 'export').join(flow(imports, 'exporter_name', 'import'), how='outer').fillna(0).reset_index()
+    table[level] = table[level].astype(str).str.zfill(code_width(level))
+    table['Product Name'] = table[level].map(product_names).fillna(level.upper() + ' ' + table[level])
+    return table.assign(year=year)[['year', 'country', level, 'export_value', 'export_quantity',
+                                    'import_value', 'import_quantity', 'Product Name']]
+
+def known_product_names():
+    names = {}
+    for year in product_years():
+        products = read_store(product_dataset(year))
+        names.update(zip(products['hs2'].astype(str).str.zfill(2), products['Product Name'].astype(str)))
+    return names
+
+def read_code_names(path):
+    # code -> description; codes may have lost their leading zero (10121 for 010121)
+    names = pd.read_csv(path, usecols=['code', 'description'], dtype={'code': str})
+    codes = [code.zfill(len(code) + len(code) % 2) for code in names['code'].str.strip()]
+    return dict(zip(codes, names['description']))
+
+def write_detail(flows, years, code_names):
+    # One file per (level, year, HS2 chapter), rows sorted by country for filtered reads
+    for level in DETAIL_LEVELS:
+        exports, imports = (df.rename(columns={'partner': partner_column})
+                            for df, partner_column in zip(flows[level], ('importer_name', 'exporter_name')))
+        names = {code: name for code, name in code_names.items() if len(code) == code_width(level)}
+        for year in years:
+            table = product_table(exports, imports, year, names, level)
+            table['hs2'] = table[level].str[:2]
+            table = typed(product_dataset(year), table).astype({level: 'category'}).sort_values(['country', level])
+            for hs2, part in table.groupby('hs2', observed=True):
+                path = detail_path(level, year, hs2)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                part.to_parquet(path, index=False, row_group_size=DETAIL_ROW_GROUP_SIZE)
+            print(f"{level} {year}: {len(table)} rows -> {os.path.dirname(detail_path(level, year, '00'))}")
+
+#################### INGEST
+def ingest(paths, reporter=REPORTER, chunksize=CHUNKSIZE, dry_run=False, detail=False, names_path=None):
+    flows = stream_flows(paths, reporter, chunksize, ['hs2'] + (DETAIL_LEVELS if detail else []))
+    exports_raw, imports_raw = flows['hs2']
+    if detail and not dry_run:
+        write_detail(flows, sorted(exports_raw['year'].unique()), read_code_names(names_path) if names_path else {})
+
+    store, affected_years = {}, set()
+    for name, raw, partner_column in (('exports', exports_raw, 'importer_name'), ('imports', imports_raw, 'exporter_name')):
+        stored = read_store(name)
+        update = typed(name, label_flows(raw, partner_column, stored))
+        merged, changed = merge_rows(stored, update, ['year', partner_column, 'hs2'])
+        print(f"{name}: {len(update)} aggregated rows, {len(changed)} new or revised")
+        affected_years.update(changed['year'].unique().tolist())
+        store[name] = (typed(name, merged), not changed.empty)
+
+    if not affected_years:
+        print("store is up to date")
+        return []
+    affected_years = sorted(affected_years)
+    print(f"rebuilding derived tables for {', '.join(map(str, affected_years))}")
+    if dry_run:
+        return affected_years
+
+    exports, imports = store['exports'][0], store['imports'][0]
+    for name, (df, changed) in store.items():
+        if changed:
+            write_parquet(df, columnar_path(name))
+
+    stored_totals = read_store('country_totals')
+    totals = country_totals(exports, imports, affected_years)
+    if stored_totals is not None:
+        totals = pd.concat([stored_totals[~stored_totals['year'].isin(affected_years)], totals])
+    write_parquet(typed('country_totals', totals.sort_values(['year', 'importer_name'])), columnar_path('country_totals'))
+
+    product_names = known_product_names()
+    for year in affected_years:
+        products = product_table(exports, imports, year, product_names)
+        write_parquet(typed(product_dataset(year), products), columnar_path(product_dataset(year)))
+        print(f"products {year}: {len(products)} rows -> {columnar_path(product_dataset(year))}")
+    return affected_years
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ingest OEC bulk trade files into the dashboard store.")
+    parser.add_argument('paths', nargs='+', metavar='RAW', help="raw OEC bulk CSV files (may be gzipped)")
+    parser.add_argument('--reporter', default=REPORTER, help=f"country whose trade is kept (default: {REPORTER})")
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE, help=f"rows read per chunk (default: {CHUNKSIZE})")
+    parser.add_argument('--detail', action='store_true', help="also write the HS4/HS6 drill-down store")
+    parser.add_argument('--names', metavar='CODES.csv', help="code,description CSV naming the HS4/HS6 products")
+    parser.add_argument('--dry-run', action='store_true', help="report what would change without writing")
+    args = parser.parse_args()
+    ingest(args.paths, args.reporter, args.chunksize, args.dry_run, args.detail, args.names)
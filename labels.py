@@ -0,0 +1,30 @@
+from functools import lru_cache
+
+### LABEL WRAPPING ###
+# Treemap tiles show product names wrapped onto several lines. The set of names
+# is small and fixed, so each name is wrapped once and then served from memory.
+
+@lru_cache(maxsize=4096)
+def wrap_text(text, width=20):
+    words = text.split()
+    lines = []
+    current_line = ""
+
+    for word in words:
+        if len(current_line) + len(word) + 1 <= width:
+            if current_line:
+                current_line += " " + word
+            else:
+                current_line = word
+        else:
+            lines.append(current_line)
+            current_line = word
+
+    if current_line:
+        lines.append(current_line)
+
+    return '<br>'.join(lines)
+
+def wrap_labels(labels, width=20):
+    # Categorical columns are mapped once per category, not once per row
+    return labels.map(lambda text: wrap_text(text, width))
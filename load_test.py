@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from profiling import process_rss_mib
+
+### LOAD TEST ###
+# Simulates N concurrent dashboard sessions in one process, the way one
+# Streamlit worker serves them. Each session is an AppTest of Homepage.py on its
+# own thread. It keeps switching pages and changing a random sidebar widget
+# (year, data type, product, country, view), plus the trend toggle. Every
+# rerun is timed, and process RSS is sampled during the run. Data and figure
+# caches are process-wide, so they are shared between the simulated sessions
+# exactly like between real users.
+# AppTest runs each script against one process-global Runtime, so two reruns
+# at once break each other: sessions take turns running (the time spent
+# waiting for the turn is reported as `wait`), and interact in parallel.
+# A failing rerun is counted as an error and the session starts over.
+#
+# Usage: python load_test.py [--sessions 1 4 8] [--reruns 30] [--seed 0] [--json results.json]
+
+HOMEPAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Homepage.py')
+PAGES = ["Trade Overview", "Product Focus", "Country Focus"]
+PAGE_SWITCH_PROBABILITY = 0.3
+RSS_SAMPLE_SECONDS = 0.2
+_run_lock = threading.Lock()
+
+class RssSampler(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.start_mib = self.peak_mib = process_rss_mib()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(RSS_SAMPLE_SECONDS):
+            self.peak_mib = max(self.peak_mib, process_rss_mib())
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.peak_mib = max(self.peak_mib, process_rss_mib())
+
+#################### SESSIONS
+def random_action(at, rng):
+    # Change one sidebar widget (other than page navigation) or the trend toggle
+    widgets = [w for w in [*at.sidebar.selectbox, *at.sidebar.radio, *at.toggle] if w.label != "Go to"]
+    if not widgets:
+        return None
+    widget = rng.choice(widgets)
+    if widget.type == 'toggle':
+        widget.set_value(not widget.value)
+    elif widget.type == 'selectbox':
+        widget.select_index(rng.randrange(len(widget.options)))
+    else:
+        widget.set_value(rng.choice(widget.options))
+    return widget.label
+
+def run_session(session_id, reruns, seed, records):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed * 1000 + session_id)
+    at = AppTest.from_file(HOMEPAGE, default_timeout=300)
+    page, action = PAGES[0], 'open'
+    for _ in range(reruns):
+        record = {'session': session_id, 'page': page, 'action': action, 'wait': 0.0, 'ms': np.nan, 'error': None}
+        queued = time.perf_counter()
+        try:
+            with _run_lock:
+                start = time.perf_counter()
+                record['wait'] = (start - queued) * 1000
+                try:
+                    at.run()
+                finally:
+                    record['ms'] = (time.perf_counter() - start) * 1000
+            if at.exception:
+                record['error'] = at.exception[0].message
+            action = None
+            if not record['error'] and rng.random() >= PAGE_SWITCH_PROBABILITY:
+                action = random_action(at, rng)
+            if action is None:
+                page, action = rng.choice(PAGES), 'switch page'
+                next(w for w in at.sidebar.radio if w.label == "Go to").set_value(page)
+        except Exception as error:
+            # counted like a script error; the session reopens the app
+            record['error'] = f"{type(error).__name__}: {error}"
+            at = AppTest.from_file(HOMEPAGE, default_timeout=300)
+            page, action = PAGES[0], 'reopen'
+        records.append(record)
+
+def run_level(sessions, reruns, seed):
+    records = []
+    sampler = RssSampler()
+    sampler.start()
+    threads = [threading.Thread(target=run_session, args=(i, reruns, seed, records)) for i in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    sampler.stop()
+    return {'sessions': sessions, 'expected_reruns': sessions * reruns, 'wall_s': wall, 'reruns_per_s': len(records) / wall,
+            'rss_start_mib': sampler.start_mib, 'rss_peak_mib': sampler.peak_mib, 'records': records}
+
+#################### REPORT
+def latency_table(records):
+    df = pd.DataFrame(records)
+    grouped = df.groupby('page', sort=False)
+    return (grouped['ms']
+            .agg(reruns='size', mean='mean',
+                 p50=lambda ms: np.nanpercentile(ms, 50), p90=lambda ms: np.nanpercentile(ms, 90),
+                 p99=lambda ms: np.nanpercentile(ms, 99), max='max')
+            .join(grouped['wait'].mean())
+            .join(grouped['error'].count().rename('errors')))
+
+def print_report(level):
+    print(f"\n=== {level['sessions']} concurrent session(s) ===")
+    print(f"{len(level['records'])} of {level['expected_reruns']} reruns in {level['wall_s']:.1f}s ({level['reruns_per_s']:.2f} reruns/s), "
+          f"RSS {level['rss_start_mib']:.0f} -> peak {level['rss_peak_mib']:.0f} MiB")
+    with pd.option_context('display.width', 200, 'display.float_format', '{:,.1f}'.format):
+        print(latency_table(level['records']).to_string())
+    for record in level['records']:
+        if record['error']:
+            print(f"error on {record['page']} after '{record['action']}': {record['error']}")
+
+if __name__ == '__main__':
+    from streamlit.logger import set_log_level
+
+    parser = argparse.ArgumentParser(description="Drive concurrent simulated sessions through the dashboard.")
+    parser.add_argument('--sessions', nargs='+', type=int, default=[1, 4, 8],
+                        help="concurrency levels to run, one after another (default: 1 4 8)")
+    parser.add_argument('--reruns', type=int, default=30, help="reruns per session (default: 30)")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the random selections (default: 0)")
+    parser.add_argument('--json', help="also write the per-rerun records to this JSON file")
+    args = parser.parse_args()
+
+    set_log_level('error')
+    levels = []
+    for sessions in args.sessions:
+        level = run_level(sessions, args.reruns, args.seed)
+        print_report(level)
+        levels.append(level)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(levels, f, indent=2)
@@ -0,0 +1,139 @@
+import json
+import os
+import resource
+import threading
+import time
+import weakref
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+### RENDER-TIME INSTRUMENTATION ###
+# Opt-in with DASHBOARD_PROFILE=1 or the ?profile=1 query parameter.
+# Homepage wraps each rerun in begin_rerun()/end_rerun(). Code anywhere below
+# it (data loading, aggregation, figure building, chart rendering) records
+# its time with `with stage(name):`. Stages are no-ops when profiling is off
+# or outside a rerun (e.g. in warmup.py workers). Each finished rerun shows a
+# breakdown in the sidebar, with rolling percentiles across reruns. It is also
+# appended as a JSON line to DASHBOARD_PROFILE_LOG when that is set.
+# A second panel lists the memory held by the shared data caches (frames
+# registered with track_frame()) next to the process RSS.
+
+PROFILE_LOG = os.environ.get('DASHBOARD_PROFILE_LOG')
+HISTORY_SIZE = 500
+
+_local = threading.local()
+_lock = threading.Lock()
+# (page, stage) -> recent durations in ms, shared by every session of the process
+_history = defaultdict(lambda: deque(maxlen=HISTORY_SIZE))
+# (dataset, part) -> frame, for every frame the data layer holds; entries go away with the frame
+_frames = weakref.WeakValueDictionary()
+
+def enabled():
+    if os.environ.get('DASHBOARD_PROFILE') == '1':
+        return True
+    return st.query_params.get('profile') == '1'
+
+def begin_rerun(page):
+    _local.record = {'page': page, 'stages': [], 'start': time.perf_counter()} if enabled() else None
+
+@contextmanager
+def stage(name):
+    record = getattr(_local, 'record', None)
+    if record is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record['stages'].append((name, (time.perf_counter() - start) * 1000))
+
+def plotly_chart(fig, **kwargs):
+    # st.plotly_chart serializes the figure to JSON, which is worth timing on its own
+    with stage('st.plotly_chart'):
+        return st.plotly_chart(fig, **kwargs)
+
+def track_frame(name, df, part=None):
+    # Frames held by the process-wide caches, listed in the memory footprint
+    _frames[(name, part)] = df
+
+def process_rss_mib():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        # No procfs (e.g. macOS): fall back to the peak, reported in bytes there
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**20
+
+def frame_bytes(df, seen):
+    # Deep size, counting each set of categories once: partitions and the
+    # export/import tables share them with the frames they come from
+    total = df.index.memory_usage(deep=True)
+    for _, column in df.items():
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            total += column.cat.codes.nbytes
+            if id(column.cat.categories) not in seen:
+                seen.add(id(column.cat.categories))
+                total += column.cat.categories.memory_usage(deep=True)
+        else:
+            total += column.memory_usage(deep=True, index=False)
+    return total
+
+def memory_footprint():
+    # Rows and memory (MiB) per cached dataset, largest first
+    seen = set()
+    rows = [(name, len(df), frame_bytes(df, seen) / 2**20) for (name, part), df in list(_frames.items())]
+    footprint = pd.DataFrame(rows, columns=['dataset', 'rows', 'MiB'])
+    return (footprint.groupby('dataset', sort=False).agg(frames=('rows', 'size'), rows=('rows', 'sum'), MiB=('MiB', 'sum'))
+            .sort_values('MiB', ascending=False).reset_index())
+
+def end_rerun():
+    record = getattr(_local, 'record', None)
+    _local.record = None
+    if record is None:
+        return
+    total = (time.perf_counter() - record['start']) * 1000
+    breakdown = (pd.DataFrame(record['stages'], columns=['stage', 'ms'])
+                 .groupby('stage', sort=False).agg(calls=('ms', 'size'), ms=('ms', 'sum')))
+    breakdown.loc['total rerun'] = [1, total]
+
+    with _lock:
+        for name, row in breakdown.iterrows():
+            _history[(record['page'], name)].append(row['ms'])
+        percentiles = pd.DataFrame(
+            [(name, len(times), *np.percentile(times, [50, 90, 99]))
+             for (page, name), times in _history.items() if page == record['page']],
+            columns=['stage', 'reruns', 'p50 ms', 'p90 ms', 'p99 ms'])
+
+    if PROFILE_LOG:
+        entry = {'time': time.time(), 'page': record['page'], 'total_ms': total,
+                 'stages': [{'stage': name, 'ms': ms} for name, ms in record['stages']]}
+        with _lock, open(PROFILE_LOG, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    with st.sidebar.expander("Render timings", expanded=True):
+        st.markdown(f"**This rerun: {total:,.0f} ms**")
+        st.dataframe(breakdown.reset_index(), hide_index=True, use_container_width=True,
+                     column_config={"ms": st.column_config.NumberColumn(format="%.1f")})
+        st.markdown("**Rolling percentiles**")
+        st.dataframe(percentiles, hide_index=True, use_container_width=True,
+                     column_config={name: st.column_config.NumberColumn(format="%.1f")
+                                    for name in ['p50 ms', 'p90 ms', 'p99 ms']})
+        st.download_button("Export timings (JSON)", data=export_history(), file_name="render_timings.json",
+                           mime="application/json", on_click='ignore')
+
+    with st.sidebar.expander("Memory"):
+        # Shared by every session: the cached frames are loaded once per process
+        footprint = memory_footprint()
+        st.markdown(f"**Process RSS: {process_rss_mib():,.0f} MiB**, cached frames: {footprint['MiB'].sum():,.1f} MiB")
+        st.dataframe(footprint, hide_index=True, use_container_width=True,
+                     column_config={"MiB": st.column_config.NumberColumn(format="%.2f")})
+
+def export_history():
+    with _lock:
+        return json.dumps([{'page': page, 'stage': name, 'ms': list(times)}
+                           for (page, name), times in _history.items()], indent=2)
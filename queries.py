@@ -0,0 +1,152 @@
+import hashlib
+import json
+
+import pandas as pd
+
+from data_loader import dataset_signature, load_dataset, load_partition, load_partitions, product_dataset, product_years
+from query_backend import (data_version, global_trend, partner_totals, partner_trend, partners, product_partners,
+                           product_totals, product_trend, product_types, years)
+
+### DASHBOARD QUERIES ###
+# The numbers behind the pages (top partners, trade summaries, top products,
+# product partners, country trends and product mixes), as plain functions over
+# the query backend and the data layer. The Streamlit pages draw them and api.py
+# serves them as JSON, so both always agree. Results are shared read-only frames
+# or small new ones; nothing here depends on Streamlit widgets.
+# Unknown years, products and countries raise KeyError (404 in api.py), bad
+# parameter values ValueError (400).
+
+DATA_TYPES = ["Export", "Import", "Trade Balance"]
+TOP_N = 10
+
+def check_data_type(data_type):
+    if data_type not in DATA_TYPES:
+        raise ValueError(f"unknown data type {data_type!r} (expected {', '.join(DATA_TYPES)})")
+    return data_type
+
+def check_year(year):
+    if year not in years():
+        raise KeyError(year)
+    return year
+
+def check_product(product):
+    if product not in product_types():
+        raise KeyError(product)
+    return product
+
+def check_partner(partner):
+    if partner not in partners():
+        raise KeyError(partner)
+    return partner
+
+def check_country(country):
+    if country not in load_partitions('country_totals', 'importer_name'):
+        raise KeyError(country)
+    return country
+
+def dataset_version():
+    # Digest of every file the queries read; changes whenever one of them is replaced
+    signatures = [data_version(), dataset_signature('country_totals'),
+                  [dataset_signature(product_dataset(year)) for year in product_years()]]
+    return hashlib.sha1(json.dumps(signatures).encode()).hexdigest()[:16]
+
+#################### TRADE OVERVIEW
+def top_partners(year, data_type, n=TOP_N):
+    # Biggest partners for Export/Import; for Trade Balance the biggest deficits first,
+    # as positive amounts. n=None keeps every partner.
+    column = 'value_' + check_data_type(data_type).lower()
+    totals = partner_totals(check_year(year)).set_index('partner')[[column, 'Continent']]
+    if data_type != "Trade Balance":
+        return totals.sort_values(by=column, ascending=False).iloc[:n]
+    deficits = totals.sort_values(by=column, ascending=True).iloc[:n]
+    return deficits.assign(**{column: deficits[column] * -1})
+
+def trade_summary(year):
+    # Total export, import and balance over the partners trading both ways
+    totals = partner_totals(check_year(year))
+    return {data_type: float(totals['value_' + data_type.lower()].sum()) for data_type in DATA_TYPES}
+
+def top_products(year, data_type):
+    # Product types with their value; for Trade Balance imports minus exports, biggest deficit first
+    check_data_type(data_type)
+    products_year = product_totals(check_year(year))
+    if data_type == "Export":
+        return products_year['value_export'].dropna().rename('value').reset_index()
+    elif data_type == "Import":
+        return products_year['value_import'].dropna().rename('value').reset_index()
+    return (products_year['value_import'] - products_year['value_export']).rename('value').sort_values(ascending=False).reset_index()
+
+def trend(product=None, partner=None):
+    # Yearly export, import and balance: overall, of one product type or with one partner
+    if product is not None:
+        return product_trend(check_product(product))
+    if partner is not None:
+        return partner_trend(check_partner(partner))
+    return global_trend()
+
+#################### PRODUCT FOCUS
+def partners_by_type(year, product):
+    # one backend slice per (year, product), split into the three data types
+    partners = product_partners(check_year(year), check_product(product))
+    df_exp_filtered = partners.loc[partners['value_export'].notna(), ['partner', 'value_export']].rename(columns={'value_export': 'value'})
+    df_imp_filtered = partners.loc[partners['value_import'].notna(), ['partner', 'value_import']].rename(columns={'value_import': 'value'})
+    # balance only for partners trading the product both ways
+    df_balance = partners.dropna(subset=['value_export', 'value_import']).rename(columns={'value_trade balance': 'value'})
+    return {"Export": df_exp_filtered, "Import": df_imp_filtered, "Trade Balance": df_balance}
+
+def top_product_partners(year, product, data_type, n=TOP_N):
+    data = partners_by_type(year, product)[check_data_type(data_type)]
+    return data.set_index('partner')[['value']].sort_values(by='value', ascending=False).head(n)
+
+def product_summary(year, product):
+    # Total export and import of the product, and their difference
+    partners = partners_by_type(year, product)
+    exports, imports = float(partners["Export"]['value'].sum()), float(partners["Import"]['value'].sum())
+    return {"Export": exports, "Import": imports, "Trade Balance": exports - imports}
+
+#################### COUNTRY FOCUS
+def countries():
+    return [str(country) for country in load_partitions('country_totals', 'importer_name')]
+
+def country_trend(country):
+    # Yearly export, import and balance with one country
+    rows = load_partition('country_totals', 'importer_name', check_country(country))
+    trend = rows[['year', 'export_value', 'import_value']].reset_index(drop=True)
+    trend['trade_balance'] = trend['export_value'] - trend['import_value']
+    return trend
+
+def largest_products(data, type, n=TOP_N):
+    # Top n non-zero products by partial selection (no full sort, caller's frame untouched)
+    return data[data[type + '_value'] > 0].nlargest(n, type + '_value')
+
+def country_products(year, country, type, n=TOP_N):
+    # Biggest HS2 products traded with the country in the year; type is 'export' or 'import'
+    if type not in ('export', 'import'):
+        raise ValueError(f"unknown type {type!r} (expected export or import)")
+    if year not in product_years():
+        raise KeyError(year)
+    # a known country without products that year has no rows
+    products = largest_products(load_partition(product_dataset(year), 'country', check_country(country)), type, n)
+    return products[['hs2', 'Product Name', type + '_value', type + '_quantity']].reset_index(drop=True)
+
+def country_rows(name, column, countries):
+    # The per-country partitions of a few countries as one frame (no scan of the full table)
+    parts = [load_partition(name, column, country) for country in countries]
+    return pd.concat(parts) if parts else load_dataset(name).iloc[:0]
+
+def countries_trend(countries):
+    # country_trend() of several countries, in one pass over their partitions
+    rows = country_rows('country_totals', 'importer_name', countries)
+    trend = rows[['year', 'importer_name', 'export_value', 'import_value']].rename(columns={'importer_name': 'country'})
+    trend['trade_balance'] = trend['export_value'] - trend['import_value']
+    return trend.sort_values(['country', 'year']).reset_index(drop=True)
+
+def countries_products(year, countries, type, n=TOP_N):
+    # country_products() rows of several countries in one pass over their partitions:
+    # one mask and one sort, then the first n rows of each country (ties keep file order, like nlargest)
+    if year not in product_years():
+        raise KeyError(year)
+    products = country_rows(product_dataset(year), 'country', countries)
+    rows = products[products[type + '_value'] > 0]
+    return (rows.sort_values(type + '_value', ascending=False, kind='stable')
+            .groupby('country', observed=True, sort=False).head(n))
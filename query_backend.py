@@ -0,0 +1,184 @@
+import os
+
+import streamlit as st
+
+import aggregates
+from cache_manager import cached
+from data_loader import source_path
+from profiling import stage
+
+### QUERY BACKENDS ###
+# The page queries (years, product types, per-partner totals with the balance,
+# per-product totals, yearly trends, partner slices) behind one set of functions.
+# DASHBOARD_QUERY_BACKEND picks where they run:
+# - pandas (default): slices of the in-memory trade cube in aggregates.py
+# - arrow: pyarrow.dataset scans of the export/import files; year/product filters
+#          are pushed down to the Parquet reader, only the matching rows are read
+# - duckdb: the same queries as SQL in an embedded DuckDB (pip install duckdb)
+# With arrow/duckdb nothing holds the full tables; each query result is small
+# and cached per dataset version.
+# Both out-of-core backends read the Parquet files from build_columnar.py (CSVs work, just without pushdown).
+
+BACKEND = os.environ.get('DASHBOARD_QUERY_BACKEND', 'pandas')
+QUERY_CACHE_SIZE = 256
+
+# (dataset, partner column, measure name) of each flow
+FLOWS = [('exports', 'importer_name', 'value_export'), ('imports', 'exporter_name', 'value_import')]
+MEASURES = ['value_export', 'value_import', 'value_trade balance']
+
+class QueryBackend:
+    # Page queries built on flow_sums(), which subclasses implement: one flow's
+    # value summed by keys ('partner' standing for the flow's partner column).
+    # Results have the same shape as the pandas/aggregates.py ones.
+    def flow_totals(self, keys, year=None, product=None, continent=False, partner=None):
+        frames = []
+        for name, partner_column, measure in FLOWS:
+            sums = self.flow_sums(name, partner_column, keys, year, product,
+                                  continent and name == 'exports', partner).rename(columns={'value': measure})
+            frames.append(sums.set_index(keys))
+        totals = frames[0].join(frames[1], how='outer')
+        totals['value_trade balance'] = totals['value_export'] - totals['value_import']
+        return totals.sort_index()
+
+    def years(self):
+        return sorted(self.flow_totals(['year']).index)
+
+    def product_types(self):
+        totals = self.flow_totals(['Product Type'])
+        return sorted(totals.index[totals['value_export'].notna()])
+
+    def partners(self):
+        return sorted(self.flow_totals(['partner']).index)
+
+    def partner_totals(self, year=None):
+        totals = self.flow_totals(['year', 'partner'], year=year, continent=True).dropna(subset=['value_export', 'value_import'])
+        totals = totals[['value_export', 'value_import', 'value_trade balance', 'Continent']]
+        return totals.reset_index() if year is None else totals.droplevel('year').reset_index()
+
+    def product_totals(self, year):
+        return self.flow_totals(['Product Type'], year=year)
+
+    def global_trend(self):
+        return self.partner_totals().groupby('year')[MEASURES].sum()
+
+    def product_trend(self, product):
+        return self.flow_totals(['year'], product=product)
+
+    def partner_trend(self, partner):
+        return self.flow_totals(['year'], partner=partner)
+
+    def yearly_totals(self, keys):
+        return self.flow_totals(['year', *keys])
+
+    def product_partners(self, year, product):
+        totals = self.flow_totals(['partner'], year=year, product=product, continent=True)
+        return totals[['value_export', 'Continent', 'value_import', 'value_trade balance']].reset_index()
+
+class ArrowBackend(QueryBackend):
+    def flow_sums(self, name, partner_column, keys, year, product, continent, partner):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        path = source_path(name)
+        dataset = ds.dataset(path, format='parquet' if path.endswith('.parquet') else 'csv')
+        columns = [partner_column if key == 'partner' else key for key in keys]
+        condition = None
+        for column, value in (('year', year), ('Product Type', product), (partner_column, partner)):
+            if value is not None:
+                term = ds.field(column) == value
+                condition = term if condition is None else condition & term
+        table = dataset.to_table(columns=columns + ['value'] + (['Continent'] if continent else []), filter=condition)
+        aggregations = [('value', 'sum')]
+        if continent:
+            # 'first' has no kernel for dictionary columns
+            table = table.set_column(table.schema.get_field_index('Continent'), 'Continent',
+                                     pc.cast(table['Continent'], pa.string()))
+            aggregations.append(('Continent', 'first'))
+        sums = table.group_by(columns).aggregate(aggregations).to_pandas()
+        return sums.rename(columns={partner_column: 'partner', 'value_sum': 'value', 'Continent_first': 'Continent'})
+
+class DuckDBBackend(QueryBackend):
+    def __init__(self):
+        import duckdb
+        self.connection = duckdb.connect()
+
+    def flow_sums(self, name, partner_column, keys, year, product, continent, partner):
+        path = source_path(name)
+        source = f"read_parquet('{path}')" if path.endswith('.parquet') else f"read_csv_auto('{path}')"
+        select = [f'"{partner_column}" AS partner' if key == 'partner' else f'"{key}"' for key in keys]
+        select.append('sum(value) AS value')
+        if continent:
+            select.append('first("Continent") AS "Continent"')
+        where, params = [], []
+        for column, value in (('year', year), ('Product Type', product), (partner_column, partner)):
+            if value is not None:
+                where.append(f'"{column}" = ?')
+                # widget values can be numpy scalars
+                params.append(value.item() if hasattr(value, 'item') else value)
+        sql = (f"SELECT {', '.join(select)} FROM {source}"
+               + (f" WHERE {' AND '.join(where)}" if where else '')
+               + f" GROUP BY {', '.join(str(i + 1) for i in range(len(keys)))}")
+        # a cursor per query, so concurrent sessions do not share one
+        return self.connection.cursor().execute(sql, params).df()
+
+BACKENDS = {'arrow': ArrowBackend, 'duckdb': DuckDBBackend}
+
+@st.cache_resource(show_spinner=False)
+def _backend(name):
+    return BACKENDS[name]()
+
+@cached('aggregates', max_entries=QUERY_CACHE_SIZE)
+def _query(backend, version, method, args):
+    # version is only part of the cache key: new data files mean new results
+    with stage(f'query {method} ({backend})'):
+        return getattr(_backend(backend), method)(*args)
+
+def _run(method, *args):
+    if BACKEND == 'pandas':
+        return getattr(aggregates, method)(*args)
+    if BACKEND not in BACKENDS:
+        raise ValueError(f"unknown DASHBOARD_QUERY_BACKEND {BACKEND!r} (expected pandas, {', '.join(BACKENDS)})")
+    return _query(BACKEND, data_version(), method, args)
+
+def data_version():
+    return aggregates.data_version()
+
+def years():
+    return _run('years')
+
+def product_types():
+    # Product types that appear in the export table
+    return _run('product_types')
+
+def partners():
+    # Every partner with exports or imports in any year
+    return _run('partners')
+
+def partner_totals(year=None):
+    # One row per (year, partner) with export, import, balance and continent
+    return _run('partner_totals', year)
+
+def product_totals(year):
+    # One row per Product Type for the year, NaN where a flow has no rows
+    return _run('product_totals', year)
+
+def global_trend():
+    # Yearly export, import and balance totals over the partners with both flows
+    return _run('global_trend')
+
+def product_trend(product):
+    # Yearly export/import totals for one Product Type
+    return _run('product_trend', product)
+
+def partner_trend(partner):
+    # Yearly export/import totals with one partner
+    return _run('partner_trend', partner)
+
+def product_partners(year, product):
+    # One row per partner trading the product in the year
+    return _run('product_partners', year, product)
+
+def yearly_totals(keys):
+    # Export/import/balance by year and keys (a tuple of 'partner' and/or 'Product Type')
+    return _run('yearly_totals', tuple(keys))
@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit.logger import set_log_level
+
+import data_loader
+
+### TEST DATA STORE ###
+# A tiny copy of the dashboard's data files (three partners, 2018 and 2022,
+# two HS2 chapters, one with a leading zero), written to a temp folder that the
+# data layer is pointed at for the duration of one test.
+# Caches are keyed on file path and mtime, so every test gets fresh results.
+
+set_log_level('error')
+
+CONTINENTS = {'China': 'Asia', 'Mexico': 'North America', 'Canada': 'North America'}
+PRODUCT_TYPES = {'01': 'Animal Products', '84': 'Machinery'}
+PRODUCT_NAMES = {'01': 'Live animals', '84': 'Machinery, mechanical appliances, & parts'}
+# (year, partner, hs2, value, quantity)
+EXPORTS = [
+    (2018, 'China', '01', 100.0, 10.0), (2018, 'China', '84', 200.0, 20.0), (2018, 'Mexico', '84', 300.0, 30.0),
+    (2022, 'China', '01', 110.0, 11.0), (2022, 'China', '84', 220.0, 22.0), (2022, 'Mexico', '84', 340.0, 34.0),
+    (2022, 'Canada', '01', 50.0, 5.0),
+]
+IMPORTS = [
+    (2018, 'China', '84', 400.0, 40.0), (2018, 'Mexico', '01', 150.0, 15.0),
+    (2022, 'China', '84', 420.0, 42.0), (2022, 'Mexico', '01', 160.0, 16.0), (2022, 'Canada', '84', 60.0, 6.0),
+]
+
+def flow_frame(rows, partner_column):
+    df = pd.DataFrame(rows, columns=['year', partner_column, 'hs2', 'value', 'quantity'])
+    return df.assign(hs_revision='HS12', Continent=df[partner_column].map(CONTINENTS),
+                     **{'Product Type': df['hs2'].map(PRODUCT_TYPES)})
+
+def product_frame(year):
+    exports = pd.DataFrame([row for row in EXPORTS if row[0] == year], columns=['year', 'country', 'hs2', 'export_value', 'export_quantity'])
+    imports = pd.DataFrame([row for row in IMPORTS if row[0] == year], columns=['year', 'country', 'hs2', 'import_value', 'import_quantity'])
+    products = exports.merge(imports, on=['year', 'country', 'hs2'], how='outer').fillna(0)
+    return products.assign(**{'Product Name': products['hs2'].map(PRODUCT_NAMES)})
+
+def country_totals_frame():
+    exports = pd.DataFrame(EXPORTS, columns=['year', 'country', 'hs2', 'value', 'quantity']).groupby(['year', 'country'])['value'].sum()
+    imports = pd.DataFrame(IMPORTS, columns=['year', 'country', 'hs2', 'value', 'quantity']).groupby(['year', 'country'])['value'].sum()
+    totals = pd.concat({'export_value': exports, 'import_value': imports}, axis=1).fillna(0).reset_index()
+    return totals.assign(importer_name=totals['country'], exporter_name=totals['country'])[
+        ['year', 'importer_name', 'export_value', 'exporter_name', 'import_value']]
+
+def write_store(data_dir):
+    flow_frame(EXPORTS, 'importer_name').to_csv(os.path.join(data_dir, 'exports_grouped.csv'), index=False)
+    flow_frame(IMPORTS, 'exporter_name').to_csv(os.path.join(data_dir, 'imports_grouped.csv'), index=False)
+    country_totals_frame().to_csv(os.path.join(data_dir, 'tab3data1.csv'), index=False)
+    product_frame(2022).to_csv(os.path.join(data_dir, 'tab3data2.csv'), index=False)
+    product_frame(2018).to_csv(os.path.join(data_dir, 'tab3data3.csv'), index=False)
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # -> data folder holding the tiny store, with the data layer reading from it
+    columnar_dir = os.path.join(tmp_path, 'columnar')
+    monkeypatch.setattr(data_loader, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(data_loader, 'COLUMNAR_DIR', columnar_dir)
+    monkeypatch.setattr(data_loader, 'PRODUCT_STORE_DIR', os.path.join(columnar_dir, 'country_products'))
+    monkeypatch.setattr(data_loader, 'HS_DETAIL_DIR', os.path.join(columnar_dir, 'hs_detail'))
+    write_store(tmp_path)
+    return tmp_path
@@ -0,0 +1,92 @@
+import asyncio
+import json
+from urllib.parse import urlencode
+
+import pytest
+
+import api
+import query_backend
+
+BACKENDS = ['pandas', 'arrow']
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, store, monkeypatch):
+    monkeypatch.setattr(query_backend, 'BACKEND', request.param)
+    monkeypatch.setattr(api, 'response_cache', api.ResponseCache())
+    return request.param
+
+def get(app, path, params=None, headers=None):
+    # One GET through the ASGI app -> (status, headers, body)
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+             'query_string': urlencode(params or {}).encode(), 'server': ('testserver', 80), 'client': ('test', 1),
+             'headers': [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = next(message for message in messages if message['type'] == 'http.response.start')
+    body = b''.join(message.get('body', b'') for message in messages if message['type'] == 'http.response.body')
+    return start['status'], {name.decode(): value.decode() for name, value in start['headers']}, body
+
+def test_top_partners(backend):
+    status, headers, body = get(api.create_app(), '/v1/top-partners', {'year': 2022, 'type': 'Export', 'n': 2})
+    assert status == 200
+    assert [row['partner'] for row in json.loads(body)['data']] == ['Mexico', 'China']
+    assert headers['etag']
+
+def test_matching_etag_gets_304(backend):
+    app = api.create_app()
+    params = {'year': 2022, 'type': 'Import'}
+    _, headers, _ = get(app, '/v1/top-partners', params)
+    status, _, body = get(app, '/v1/top-partners', params, {'If-None-Match': headers['etag']})
+    assert status == 304 and body == b''
+    # the ETag belongs to one URL
+    status, _, _ = get(app, '/v1/top-partners', {'year': 2018, 'type': 'Import'}, {'If-None-Match': headers['etag']})
+    assert status == 200
+
+def test_etag_of_another_url_does_not_hide_a_404(backend):
+    app = api.create_app()
+    _, headers, _ = get(app, '/v1/years')
+    status, _, _ = get(app, '/v1/top-partners', {'year': 1999, 'type': 'Export'}, {'If-None-Match': headers['etag']})
+    assert status == 404
+
+@pytest.mark.parametrize('path, params', [
+    ('/v1/top-partners', {'year': '2022', 'type': 'Exports'}),
+    ('/v1/top-partners', {'year': '2022', 'type': 'Export', 'n': '0'}),
+    ('/v1/top-partners', {'year': '2022', 'type': 'Export', 'n': '-2'}),
+    ('/v1/country-products', {'year': '2022', 'country': 'China', 'type': 'export', 'n': 'ten'}),
+    ('/v1/trade-summary', {}),
+])
+def test_bad_parameters_get_400(backend, path, params):
+    status, body, _ = api.respond(path, params)
+    assert status == 400
+    assert 'error' in json.loads(body)
+
+@pytest.mark.parametrize('path, params', [
+    ('/v1/top-partners', {'year': '1999', 'type': 'Export'}),
+    ('/v1/trade-summary', {'year': '1999'}),
+    ('/v1/top-products', {'year': '1999', 'type': 'Export'}),
+    ('/v1/product-partners', {'year': '2022', 'product': 'Nope', 'type': 'Export'}),
+    ('/v1/product-summary', {'year': '2022', 'product': 'Nope'}),
+    ('/v1/trend', {'product': 'Nope'}),
+    ('/v1/trend', {'partner': 'Nowhere'}),
+    ('/v1/country-trend', {'country': 'Nowhere'}),
+])
+def test_unknown_keys_get_404(backend, path, params):
+    status, body, etag = api.respond(path, params)
+    assert status == 404
+    assert etag is None
+
+def test_known_keys_get_200(backend):
+    assert api.respond('/v1/trend', {'partner': 'Canada'})[0] == 200
+    assert api.respond('/v1/trend', {'product': 'Machinery'})[0] == 200
+    status, body, _ = api.respond('/v1/trade-summary', {'year': '2022'})
+    assert status == 200
+    # partners trading both ways in 2022: China, Mexico, Canada
+    assert json.loads(body)['data']['Export'] == pytest.approx(720.0)
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+from PIL import Image
+
+import image_cache
+
+BASE_URL = 'https://upload.wikimedia.org/wikipedia/commons/a/ab/'
+# URL -> file name in the source folder (percent-encoding undone)
+SOURCES = {BASE_URL + 'Red%20apple.png': 'Red apple.png', BASE_URL + 'Steel_bolt.jpg': 'Steel_bolt.jpg'}
+
+@pytest.fixture
+def thumbnails(tmp_path, monkeypatch):
+    # -> (source folder with the originals, thumbnail folder)
+    source_dir, thumbnail_dir = tmp_path / 'originals', tmp_path / 'thumbnails'
+    source_dir.mkdir()
+    for filename in SOURCES.values():
+        Image.new('RGB', (800, 600), 'red').save(source_dir / filename)
+    monkeypatch.setattr(image_cache, 'THUMBNAIL_DIR', str(thumbnail_dir))
+    image_cache.thumbnail_src.clear()
+    yield str(source_dir), thumbnail_dir
+    image_cache.thumbnail_src.clear()
+
+def thumbnail_path(thumbnail_dir, url):
+    return thumbnail_dir / image_cache.thumbnail_name(url)
+
+def no_fetch(url, source_dir=None):
+    raise OSError(f"unexpected fetch of {url}")
+
+def test_builds_thumbnails_from_source_folder(thumbnails):
+    source_dir, thumbnail_dir = thumbnails
+    built, skipped, failures = image_cache.build_thumbnails(SOURCES, source_dir)
+
+    assert (built, skipped, failures) == (2, 0, [])
+    for url in SOURCES:
+        with Image.open(thumbnail_path(thumbnail_dir, url)) as image:
+            assert image.format == 'JPEG'
+            assert max(image.size) == image_cache.THUMBNAIL_SIZE
+
+def test_rerun_skips_existing_thumbnails(thumbnails, monkeypatch):
+    source_dir, thumbnail_dir = thumbnails
+    image_cache.build_thumbnails(SOURCES, source_dir)
+    mtimes = {url: os.stat(thumbnail_path(thumbnail_dir, url)).st_mtime_ns for url in SOURCES}
+
+    monkeypatch.setattr(image_cache, 'fetch_original', no_fetch)
+    assert image_cache.build_thumbnails(SOURCES, source_dir) == (0, 2, [])
+    assert {url: os.stat(thumbnail_path(thumbnail_dir, url)).st_mtime_ns for url in SOURCES} == mtimes
+
+def test_force_rebuilds(thumbnails):
+    source_dir, _ = thumbnails
+    image_cache.build_thumbnails(SOURCES, source_dir)
+    assert image_cache.build_thumbnails(SOURCES, source_dir, force=True) == (2, 0, [])
+
+def test_missing_original_is_reported(thumbnails):
+    source_dir, thumbnail_dir = thumbnails
+    url = BASE_URL + 'Missing.png'
+    built, skipped, failures = image_cache.build_thumbnails([url], source_dir)
+
+    assert (built, skipped) == (0, 0)
+    assert [failed_url for failed_url, _ in failures] == [url]
+    assert not thumbnail_path(thumbnail_dir, url).exists()
+
+def test_thumbnail_src_serves_built_thumbnail(thumbnails, monkeypatch):
+    source_dir, _ = thumbnails
+    image_cache.build_thumbnails(SOURCES, source_dir)
+    monkeypatch.setattr(image_cache, 'fetch_original', no_fetch)
+    for url in SOURCES:
+        assert image_cache.thumbnail_src(url) == image_cache.THUMBNAIL_URL + image_cache.thumbnail_name(url)
+
+def test_thumbnail_src_falls_back_to_remote_url(thumbnails, monkeypatch):
+    _, thumbnail_dir = thumbnails
+    # no thumbnail on disk and the original cannot be fetched
+    monkeypatch.setattr(image_cache, 'fetch_original', no_fetch)
+    url = BASE_URL + 'Red%20apple.png'
+    assert image_cache.thumbnail_src(url) == url
+    assert not thumbnail_path(thumbnail_dir, url).exists()
+
+def test_thumbnail_src_keeps_non_raster_urls(thumbnails, monkeypatch):
+    monkeypatch.setattr(image_cache, 'fetch_original', no_fetch)
+    url = BASE_URL + 'Diagram.svg'
+    assert image_cache.thumbnail_src(url) == url
@@ -0,0 +1,97 @@
+import os
+
+import pandas as pd
+import pytest
+
+import data_loader
+import ingest
+from conftest import EXPORTS, IMPORTS
+
+REPORTER = "United States"
+
+def write_raw(path, exports=(), imports=()):
+    # Raw OEC-style bulk file: one HS6 row per (year, partner, HS2) row, codes kept as text
+    rows = [(year, REPORTER, partner, hs2 + '0101', value, quantity) for year, partner, hs2, value, quantity in exports]
+    rows += [(year, partner, REPORTER, hs2 + '0101', value, quantity) for year, partner, hs2, value, quantity in imports]
+    pd.DataFrame(rows, columns=['year', 'exporter_name', 'importer_name', 'hs6', 'value', 'quantity']).to_csv(path, index=False)
+    return str(path)
+
+def stored_files(store):
+    # path -> mtime of every file under the store folder
+    return {os.path.join(root, name): os.stat(os.path.join(root, name)).st_mtime_ns
+            for root, _, names in os.walk(store) for name in names}
+
+def flows_of(year):
+    return [row for row in EXPORTS if row[0] == year], [row for row in IMPORTS if row[0] == year]
+
+def stored_flow(name):
+    return ingest.read_store(name).astype({'hs2': str})
+
+def test_new_year_is_appended(store):
+    exports, imports = flows_of(2022)
+    new_exports = [(2023, partner, hs2, value * 2, quantity) for _, partner, hs2, value, quantity in exports]
+    raw = write_raw(store / 'raw.csv', exports + new_exports, imports)
+
+    assert ingest.ingest([raw]) == [2023]
+
+    stored = stored_flow('exports')
+    assert sorted(stored['year'].unique()) == [2018, 2022, 2023]
+    assert len(stored[stored['year'] == 2022]) == len(exports)
+    assert stored.loc[stored['year'] == 2023, 'value'].sum() == pytest.approx(sum(row[3] for row in new_exports))
+    # the new year gets its own product partition, and the untouched years keep theirs
+    assert 2023 in data_loader.product_years()
+    assert os.path.exists(data_loader.columnar_path('products_2023'))
+    assert not os.path.exists(data_loader.columnar_path('products_2022'))
+
+def test_revised_row_replaces_the_stored_one(store):
+    exports, imports = flows_of(2022)
+    revised = [(year, partner, hs2, 999.0 if (partner, hs2) == ('China', '01') else value, quantity)
+               for year, partner, hs2, value, quantity in exports]
+    raw = write_raw(store / 'raw.csv', revised, imports)
+
+    assert ingest.ingest([raw]) == [2022]
+
+    stored = stored_flow('exports')
+    rows = stored[(stored['year'] == 2022) & (stored['importer_name'] == 'China') & (stored['hs2'] == '01')]
+    assert rows['value'].tolist() == [999.0]
+    assert len(stored) == len(EXPORTS)
+    # the rebuilt product partition of the year has the revised value
+    products = ingest.read_store('products_2022').astype({'hs2': str})
+    assert products.loc[(products['country'] == 'China') & (products['hs2'] == '01'), 'export_value'].tolist() == [999.0]
+
+def test_unchanged_rerun_writes_nothing(store):
+    raw = write_raw(store / 'raw.csv', *flows_of(2022))
+    before = stored_files(store)
+
+    assert ingest.ingest([raw]) == []
+    assert stored_files(store) == before
+
+def test_rerun_after_an_ingest_writes_nothing(store):
+    exports, imports = flows_of(2022)
+    raw = write_raw(store / 'raw.csv', exports + [(2023, 'China', '84', 1.0, 1.0)], imports)
+    assert ingest.ingest([raw]) == [2023]
+    before = stored_files(store)
+
+    assert ingest.ingest([raw]) == []
+    assert stored_files(store) == before
+
+def test_dry_run_writes_nothing(store):
+    exports, imports = flows_of(2022)
+    raw = write_raw(store / 'raw.csv', exports + [(2023, 'China', '84', 1.0, 1.0)], imports)
+    before = stored_files(store)
+
+    assert ingest.ingest([raw], dry_run=True) == [2023]
+    assert stored_files(store) == before
+
+@pytest.mark.parametrize('stored_code', ['01', '1'])
+def test_leading_zero_codes_match_the_store(store, stored_code):
+    # the store may keep chapter 01 as "01" or as "1"; raw codes always have the zero
+    for filename in ('exports_grouped.csv', 'imports_grouped.csv'):
+        df = pd.read_csv(store / filename, dtype={'hs2': str})
+        df['hs2'] = df['hs2'].replace('01', stored_code)
+        df.to_csv(store / filename, index=False)
+    raw = write_raw(store / 'raw.csv', *flows_of(2022))
+
+    assert ingest.ingest([raw]) == []
+    stored = stored_flow('exports')
+    assert sorted(stored['hs2'].unique()) == sorted([stored_code, '84'])
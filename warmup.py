@@ -0,0 +1,91 @@
+import argparse
+import importlib
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+### FIGURE WARM-UP JOB ###
+# Renders every figure the three pages can show and stores it in the on-disk
+# figure cache (see figure_cache.py), so the first user on each selection after
+# a deploy gets a cached render. Figures already on disk for the current
+# dataset version are skipped, so re-running after a data update is cheap.
+#
+# Usage: python warmup.py [--workers N] [--pages demo product_focus app3] [--clear]
+
+PAGES = ['demo', 'product_focus', 'app3']
+DATA_TYPES = ["Export", "Import", "Trade Balance"]
+
+def page_tasks(page):
+    # (module, function, args) for every figure the page can request
+    from query_backend import product_types, years
+    from data_loader import load_dataset, product_years
+
+    tasks = []
+    if page == 'demo':
+        tasks.append(('demo', 'get_trend_chart', ()))
+        for year in years():
+            for selected_type in DATA_TYPES:
+                tasks.append(('demo', 'get_choropleth', (int(year), 'value_' + selected_type.lower())))
+                tasks.append(('demo', 'get_product_treemap', (int(year), selected_type)))
+    elif page == 'product_focus':
+        for product in product_types():
+            tasks.append(('product_focus', 'get_trend_chart', (product,)))
+            for year in years():
+                for selected_type in DATA_TYPES:
+                    tasks.append(('product_focus', 'get_choropleth', (int(year), selected_type, product)))
+    elif page == 'app3':
+        for country in load_dataset('country_totals')['importer_name'].unique().tolist():
+            tasks.append(('app3', 'get_country_trade_figures', (country,)))
+            for year in product_years():
+                for type in ("export", "import"):
+                    tasks.append(('app3', 'get_treemap', (year, country, type)))
+    return tasks
+
+def _init_worker():
+    from streamlit.logger import set_log_level
+    from figure_cache import figure_cache
+
+    set_log_level('error')
+    figure_cache.persist = True
+
+def _run_chunk(tasks):
+    failures = []
+    for module, function, args in tasks:
+        try:
+            getattr(importlib.import_module(module), function)(*args)
+        except Exception as exc:
+            failures.append(f"{module}.{function}{args}: {exc!r}")
+    return len(tasks), failures
+
+def warm_up(pages=PAGES, workers=None, chunk_size=25):
+    tasks = [task for page in pages for task in page_tasks(page)]
+    chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+    done, failures = 0, []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for future in as_completed([pool.submit(_run_chunk, chunk) for chunk in chunks]):
+            count, chunk_failures = future.result()
+            done += count
+            failures.extend(chunk_failures)
+            print(f"{done}/{len(tasks)} figures ({time.perf_counter() - start:.1f}s)")
+    for failure in failures:
+        print(f"failed: {failure}")
+    return done - len(failures), failures
+
+if __name__ == '__main__':
+    from streamlit.logger import set_log_level
+    from figure_cache import FIGURE_CACHE_DIR
+
+    parser = argparse.ArgumentParser(description="Pre-render every dashboard figure into the on-disk figure cache.")
+    parser.add_argument('--pages', nargs='+', choices=PAGES, default=PAGES, help="pages to warm up (default: all)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--clear', action='store_true', help=f"delete {FIGURE_CACHE_DIR} first")
+    args = parser.parse_args()
+
+    set_log_level('error')
+    if args.clear and os.path.isdir(FIGURE_CACHE_DIR):
+        shutil.rmtree(FIGURE_CACHE_DIR)
+    rendered, failures = warm_up(args.pages, args.workers)
+    print(f"{rendered} figures cached in {FIGURE_CACHE_DIR}")
+    raise SystemExit(1 if failures else 0)